@@ -0,0 +1,260 @@
+import json
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import markdown
+from mkdocs.commands.build import build
+from mkdocs.config import load_config
+from mkdocs.config.base import Config
+from mkdocs.structure.files import File
+from mkdocs.structure.pages import Page
+
+from mkdocs_markmap.__meta__ import PROJECT_VERSION
+from mkdocs_markmap.extension import MarkmapPreprocessor
+from mkdocs_markmap.plugin import MarkmapPlugin
+
+
+IMPORT_MODULES: List[str] = ['mkdocs_markmap.extension', 'mkdocs_markmap.plugin']
+
+# dependencies, which must not be imported before they are needed
+DEFERRED_MODULES: List[str] = ['bs4', 'requests', 'urllib3', 'cProfile', 'mkdocs.livereload']
+
+IMPORT_SCRIPT: str = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+print(' '.join(name for name in {deferred!r} if name in sys.modules))
+"""
+
+WORDS: List[str] = 'alpha beta gamma delta epsilon zeta eta theta iota kappa lambda omicron sigma omega'.split()
+
+
+class SiteGenerator(object):
+    """
+    Generates a synthetic mkdocs site with markmaps
+    """
+
+    def __init__(
+        self,
+        pages: int = 100,
+        markmap_fraction: float = 0.5,
+        markmaps_per_page: int = 2,
+        include_fanout: int = 1,
+        nodes: int = 50,
+        seed: int = 0,
+    ) -> None:
+        self.pages = pages
+        self.markmap_fraction = markmap_fraction
+        self.markmaps_per_page = markmaps_per_page
+        self.include_fanout = include_fanout
+        self.nodes = nodes
+        self.random = random.Random(seed)
+
+    @property
+    def parameters(self) -> Dict[str, Any]:
+        return {
+            'pages': self.pages,
+            'markmap_fraction': self.markmap_fraction,
+            'markmaps_per_page': self.markmaps_per_page,
+            'include_fanout': self.include_fanout,
+            'nodes': self.nodes,
+        }
+
+    def _text(self, words: int) -> str:
+        return ' '.join(self.random.choice(WORDS) for _ in range(words))
+
+    def markmap(self) -> str:
+        lines: List[str] = [f'# {self._text(2)}']
+        for index in range(self.nodes - 1):
+            depth: int = index % 3
+            if depth == 0:
+                lines.append(f'\n## {self._text(2)}\n')
+            else:
+                lines.append(f'{"  " * (depth - 1)}* {self._text(3)}')
+
+        return '\n'.join(lines) + '\n'
+
+    def page(self, index: int, includes: List[str]) -> str:
+        lines: List[str] = [f'# Page {index}', '', self._text(40), '']
+        if index < self.pages * self.markmap_fraction:
+            for _ in range(self.markmaps_per_page):
+                lines.extend(['```markmap', self.markmap(), '```', '', self._text(20), ''])
+            for include in self.random.sample(includes, min(self.include_fanout, len(includes))):
+                lines.extend([f'{{! {include} !}}', ''])
+
+        return '\n'.join(lines)
+
+    def generate(self, path: Path) -> Path:
+        docs_path: Path = path / 'docs'
+        mindmaps_path: Path = path / 'mindmaps'
+        docs_path.mkdir(parents=True)
+        mindmaps_path.mkdir(parents=True)
+
+        includes: List[str] = []
+        for index in range(max(self.include_fanout, 1) * 2):
+            name: str = f'map{index}.mm.md'
+            (mindmaps_path / name).write_text(self.markmap())
+            includes.append(name)
+
+        for index in range(self.pages):
+            (docs_path / f'page{index}.md').write_text(self.page(index, includes))
+
+        # vendor scripts are disabled to measure the plugin without network access
+        (path / 'mkdocs.yml').write_text('\n'.join([
+            'site_name: markmap benchmark',
+            'plugins:',
+            '  - markmap:',
+            f'      base_path: {mindmaps_path}',
+            "      d3_version: ''",
+            "      lib_version: ''",
+            "      view_version: ''",
+            '',
+        ]))
+
+        return path / 'mkdocs.yml'
+
+
+class Benchmark(object):
+    def __init__(self, generator: SiteGenerator, repeat: int = 5) -> None:
+        self.generator = generator
+        self.repeat = repeat
+        self.results: Dict[str, Dict[str, float]] = {}
+
+    def _measure(self, name: str, function: Callable[[], Any]) -> None:
+        timings: List[float] = []
+        for _ in range(self.repeat):
+            start: float = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+
+        # memory is measured separately, since tracing slows down execution
+        tracemalloc.start()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.results[name] = {
+            'min': min(timings),
+            'median': statistics.median(timings),
+            'peak_memory': peak,
+        }
+        print(f'{name}: {min(timings) * 1000:.1f} ms (median {statistics.median(timings) * 1000:.1f} ms), '
+              f'peak memory {peak / 1024:.0f} KiB')
+
+    def _imports(self) -> None:
+        """
+        Measures import times in fresh interpreters, reporting deferred dependencies imported too early
+        """
+        for module in IMPORT_MODULES:
+            timings: List[float] = []
+            for _ in range(self.repeat):
+                script: str = IMPORT_SCRIPT.format(module=module, deferred=DEFERRED_MODULES)
+                output: List[str] = subprocess.check_output([sys.executable, '-c', script], text=True).split('\n')
+                timings.append(float(output[0]))
+                if output[1]:
+                    print(f'warning: {module} imports deferred modules: {output[1]}')
+
+            self.results[f'import {module}'] = {'min': min(timings), 'median': statistics.median(timings)}
+            print(f'import {module}: {min(timings) * 1000:.1f} ms (median {statistics.median(timings) * 1000:.1f} ms)')
+
+    def _load(self, config_path: Path) -> Config:
+        config: Config = load_config(str(config_path))
+        config = config['plugins'].run_event('config', config)
+
+        return config
+
+    def _isolated(self, config: Config) -> None:
+        plugin: MarkmapPlugin = config['plugins']['markmap']
+        docs_path: Path = Path(config['docs_dir'])
+        sources: List[Path] = sorted(docs_path.glob('*.md'))
+        pages: List[Page] = [
+            Page(None, File(str(path.relative_to(docs_path)), config['docs_dir'], config['site_dir'], False), config)
+            for path in sources
+        ]
+        texts: List[str] = [path.read_text() for path in sources]
+
+        md = markdown.Markdown(extensions=config['markdown_extensions'], extension_configs=config['mdx_configs'])
+        preprocessor: MarkmapPreprocessor = md.preprocessors['include_markmap']
+        lines: List[List[str]] = [text.split('\n') for text in texts]
+        self._measure('MarkmapPreprocessor.run', lambda: [preprocessor.run(list(page)) for page in lines])
+
+        htmls: List[str] = []
+        markmaps_found: List[int] = []
+        for page, text in zip(pages, texts):
+            plugin.on_page_markdown(text, page=page)
+            htmls.append(md.reset().convert(text))
+            # on_page_markdown resets the markmaps found by the extension, which is not run again below
+            markmaps_found.append(plugin._markmaps_found)
+            plugin.on_page_content(htmls[-1], page=page)
+
+        def page_content() -> None:
+            for page, text, html, found in zip(pages, texts, htmls, markmaps_found):
+                plugin.on_page_markdown(text, page=page)
+                plugin._markmaps_found = found
+                plugin.on_page_content(html, page=page)
+        self._measure('on_page_content', page_content)
+
+        flagged: int = sum(getattr(page, '_found_markmap', False) for page in pages)
+        expected: int = sum(found > 0 for found in markmaps_found)
+        assert flagged == expected, f'{flagged} of {expected} markmap pages flagged'
+
+        documents: List[str] = [f'<html><head></head><body>{html}</body></html>' for html in htmls]
+        plugin.on_pre_build(config)
+        self._measure('on_post_page', lambda: [
+            plugin.on_post_page(document, page=page, config=config)
+            for page, document in zip(pages, documents)
+        ])
+
+    def run(self) -> Dict[str, Any]:
+        path: Path = Path(tempfile.mkdtemp(prefix='mkdocs-markmap-benchmark-'))
+        try:
+            config_path: Path = self.generator.generate(path)
+            self._imports()
+            self._isolated(self._load(config_path))
+            self._measure('mkdocs build', lambda: build(load_config(str(config_path))))
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+        return {
+            'version': PROJECT_VERSION,
+            'python': platform.python_version(),
+            'parameters': self.generator.parameters,
+            'results': self.results,
+        }
+
+
+def save(results: Dict[str, Any], output: str) -> None:
+    Path(output).write_text(json.dumps(results, indent=2))
+    print(f'results written: {output}')
+
+
+def compare(results: Dict[str, Any], baseline_path: str, threshold: float = 0.1) -> bool:
+    """
+    Compares median timings with a baseline, returns False on regressions beyond the threshold
+    """
+    baseline: Dict[str, Any] = json.loads(Path(baseline_path).read_text())
+    if baseline.get('parameters') != results['parameters']:
+        print('warning: baseline was recorded with different parameters')
+
+    success: bool = True
+    for name, result in results['results'].items():
+        previous: Optional[Dict[str, float]] = baseline.get('results', {}).get(name)
+        if previous is None:
+            continue
+
+        change: float = result['median'] / previous['median'] - 1
+        marker: str = 'REGRESSION' if change > threshold else 'ok'
+        success = success and change <= threshold
+        print(f'{name}: {change:+.1%} ({baseline.get("version")} -> {results["version"]}) {marker}')
+
+    return success
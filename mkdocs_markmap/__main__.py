@@ -0,0 +1,4 @@
+from .render import main
+
+
+main()
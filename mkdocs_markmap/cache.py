@@ -0,0 +1,105 @@
+from contextlib import suppress
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import shutil
+from typing import Any, Dict, List, Optional, Tuple
+
+from .utils import _write_atomic
+
+
+log = logging.getLogger("mkdocs.markmap")
+
+
+PAGE_CACHE_DIR: str = ".cache/mkdocs-markmap"
+ENTRIES_DIR: str = "pages"
+BLOBS_DIR: str = "blobs"
+
+
+class PageCache(object):
+    """
+    Persistent cache of processed pages and the data files they reference, evicting least recently used entries
+    """
+
+    def __init__(self, path: Path, max_size: int = 100 * 1024 * 1024):
+        self.path: Path = path
+        self.max_size: int = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode())
+            digest.update(b"\0")
+
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.path / ENTRIES_DIR / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry_path: Path = self._entry_path(key)
+        try:
+            entry: Dict[str, Any] = json.loads(entry_path.read_text(encoding="utf-8"))
+            # the modification time tracks the last use for eviction
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry
+
+    def set(self, key: str, entry: Dict[str, Any]) -> None:
+        try:
+            _write_atomic(self._entry_path(key), [json.dumps(entry, ensure_ascii=False).encode()])
+        except OSError as e:
+            log.debug(f"unable to write page cache entry: {e}")
+
+    def store_blob(self, name: str, file_path: Path) -> None:
+        blob_path: Path = self.path / BLOBS_DIR / name
+        if blob_path.exists():
+            os.utime(blob_path)
+            return
+
+        with suppress(OSError):
+            _write_atomic(blob_path, [file_path.read_bytes()])
+
+    def load_blob(self, name: str) -> Optional[bytes]:
+        with suppress(OSError):
+            return (self.path / BLOBS_DIR / name).read_bytes()
+
+        return None
+
+    def prune(self) -> None:
+        """
+        Removes least recently used entries and blobs, until the cache fits into its maximum size
+        """
+        files: List[Tuple[float, int, Path]] = []
+        for directory in (ENTRIES_DIR, BLOBS_DIR):
+            for file_path in (self.path / directory).rglob("*"):
+                with suppress(OSError):
+                    if file_path.is_file():
+                        stat: os.stat_result = file_path.stat()
+                        files.append((stat.st_mtime, stat.st_size, file_path))
+
+        size: int = sum(file_size for _, file_size, _ in files)
+        removed: int = 0
+        for _, file_size, file_path in sorted(files, key=lambda item: item[0]):
+            if size <= self.max_size:
+                break
+            with suppress(OSError):
+                file_path.unlink()
+                size -= file_size
+                removed += 1
+
+        if removed:
+            log.debug(f"page cache entries evicted: {removed}")
+
+    def clear(self) -> None:
+        shutil.rmtree(self.path, ignore_errors=True)
+        log.info(f"page cache cleared: {self.path}")
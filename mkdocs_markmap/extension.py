@@ -1,19 +1,163 @@
 import base64
+from collections import OrderedDict
+import json
 import logging
+import os
 import re
+import zlib
 from functools import partial
 from pathlib import Path
-from typing import AnyStr, Dict, List, Optional
+from threading import Lock
+from typing import AnyStr, Callable, Dict, List, Optional, Set, Tuple
 
+import attr
 from markdown import Markdown
 from markdown.extensions import Extension
 from markdown.preprocessors import Preprocessor
 
+from .stats import STATS
+from .svg import prerender as prerender_svg
+from .transform import TRANSFORM_CACHE
+
 
 log = logging.getLogger("mkdocs.markmap")
 
 
 INCLUDE_SYNTAX = re.compile(r"\{!\s*(?P<path>.+?)\s*!\}")
+# matches fences like fenced_code does, which closes them by the exact opening fence
+FENCE_SYNTAX = re.compile(r"^(?P<fence>~{3,}|`{3,})(?P<info>.*)$")
+MARKMAP_INFO_SYNTAX = re.compile(r"^[ ]*\.?markmap[ ]*$")
+
+MARKMAP_CLASS: str = "mkdocs-markmap"
+MARKMAP_TEMPLATE: str = '<div class="{class_name}">{svg}<markmap-data encoding="{encoding}"{attributes} hidden="true">{data}</markmap-data></div>'
+
+PAYLOAD_ENCODINGS: Tuple[str, ...] = ("base64", "deflate", "json")
+JSON_PAYLOAD_SYNTAX = re.compile(r'\A<script type="application/json">(?P<data>.*)</script>\Z', re.DOTALL)
+
+
+def encode_markmap(content: str, encoding: str = "base64", tree: bool = False) -> str:
+    """
+    Encodes a markmap (or its node tree as json) to avoid being handled by other plugins like KaTeX
+    """
+    if encoding == "json":
+        data: str = content if tree else json.dumps(content, ensure_ascii=False)
+        # "<" is escaped, so that the script element cannot be closed by its content
+        data = data.replace("<", "\\u003c")
+        return f'<script type="application/json">{data}</script>'
+
+    raw: bytes = content.encode()
+    if encoding == "deflate":
+        raw = zlib.compress(raw, 9)
+
+    return base64.b64encode(raw).decode()
+
+
+def decode_markmap(payload: str, encoding: str = "base64", tree: bool = False) -> str:
+    """
+    Reverses encode_markmap, providing the markmap (or its node tree as json)
+    """
+    if encoding == "json":
+        match: Optional[re.Match] = JSON_PAYLOAD_SYNTAX.match(payload.strip())
+        data: str = match.group("data") if match is not None else payload
+        return data if tree else json.loads(data)
+
+    if encoding not in PAYLOAD_ENCODINGS:
+        return payload
+
+    raw: bytes = base64.b64decode(payload.strip())
+    if encoding == "deflate":
+        raw = zlib.decompress(raw)
+
+    return raw.decode()
+
+
+def render_markmap(
+    markmap: str,
+    payload: Optional[str] = None,
+    transform: bool = False,
+    prerender: bool = False,
+    payload_encoding: str = "base64",
+) -> str:
+    """
+    Provides the final markup of a markmap as expected by mkdocs-markmap.js
+    """
+    attributes: str = ""
+    if transform:
+        attributes = ' format="tree"'
+        data: str = encode_markmap(TRANSFORM_CACHE.get(markmap), payload_encoding, tree=True)
+    else:
+        data = encode_markmap(markmap, payload_encoding) if payload is None else payload
+    svg: str = prerender_svg(markmap) if prerender else ""
+    return MARKMAP_TEMPLATE.format(
+        class_name=MARKMAP_CLASS,
+        svg=svg,
+        encoding=payload_encoding,
+        attributes=attributes,
+        data=data,
+    )
+
+
+@attr.attrs
+class CachedInclude(object):
+    text: str = attr.attrib()
+    _payloads: Dict[str, str] = attr.attrib(factory=dict)
+
+    def payload(self, encoding: str = "base64") -> str:
+        """
+        Provides the encoded text, encoded once per encoding
+        """
+        if encoding not in self._payloads:
+            self._payloads[encoding] = encode_markmap(self.text, encoding)
+
+        return self._payloads[encoding]
+
+
+class IncludeCache(object):
+    """
+    Bounded LRU cache of included mindmaps, shared across pages and rebuilds
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize: int = maxsize
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: "OrderedDict[Tuple[Path, str], Tuple[Tuple[int, int], CachedInclude]]" = OrderedDict()
+        self._lock: Lock = Lock()
+
+    def get(self, path: Path, encoding: str) -> CachedInclude:
+        """
+        Provides the content of a file, which is read again only if mtime or size changed
+        """
+        stat: os.stat_result = path.stat()
+        key: Tuple[Path, str] = (path, encoding)
+        signature: Tuple[int, int] = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                STATS.count("cache_hits")
+                return entry[1]
+
+        text: str = path.read_text(encoding=encoding)
+        include: CachedInclude = CachedInclude(text=text)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (signature, include)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        return include
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+INCLUDE_CACHE: IncludeCache = IncludeCache()
 
 
 class MarkmapPreprocessor(Preprocessor):
@@ -26,58 +170,149 @@ class MarkmapPreprocessor(Preprocessor):
         self.base_path: str = config["base_path"]
         self.encoding: str = config["encoding"]
         self.file_extension: str = config["file_extension"]
+        self.transform: bool = config["transform"]
+        self.prerender: bool = config["prerender"]
+        self.payload_encoding: str = config["payload_encoding"]
+        self.on_markmap: Callable[[], None] = config["on_markmap"]
+        self.on_include: Callable[[Path], None] = config["on_include"]
+        self.skip_includes: Callable[[], bool] = config["skip_includes"]
+
+    def _render(self, markmap: str, payload: Optional[str] = None) -> str:
+        self.on_markmap()
+
+        return render_markmap(
+            markmap,
+            payload,
+            transform=self.transform,
+            prerender=self.prerender,
+            payload_encoding=self.payload_encoding,
+        )
 
     def run(self, lines: List[str]) -> List[str]:
-        done: bool = False
-        included_paths: List[Path] = []
-        while not done:
-            for loc, line in enumerate(lines):
-                match: Optional[re.Match[AnyStr]] = INCLUDE_SYNTAX.search(line)
-                if match is None:
-                    continue
+        if self.skip_includes() or not any("{!" in line for line in lines):
+            return lines
 
-                path: Path = Path(match.group("path"))
-                if not path.name.lower().endswith(self.file_extension):
-                    continue
+        output: List[str] = []
+        included_paths: Set[Path] = set()
+        with STATS.measure("MarkmapPreprocessor.run"):
+            for line in lines:
+                self._expand(line, output, included_paths)
 
-                if not path.is_absolute():
-                    path = (Path(self.base_path) / path).resolve()
+        return output
 
-                if path in included_paths:
-                    log.warning(f"loop detected while including: {path}")
-                    continue
+    def _expand(self, line: str, output: List[str], included_paths: Set[Path]) -> None:
+        """
+        Appends the line to output, expanding its include statements from left to right
+        """
+        position: int = 0
+        while True:
+            match: Optional[re.Match[AnyStr]] = INCLUDE_SYNTAX.search(line, position)
+            if match is None:
+                output.append(line)
+                return
 
-                included_paths.append(path)
-                try:
-                    markmap: str = path.read_text(encoding=self.encoding)
+            path: Path = Path(match.group("path"))
+            if not path.name.lower().endswith(self.file_extension):
+                position = match.end()
+                continue
 
-                except Exception as e:
-                    log.error("unable to include file {}. Ignoring statement. Error: {}".format(path, e))
-                    lines[loc] = INCLUDE_SYNTAX.sub("",line)
-                    break
+            if not path.is_absolute():
+                path = (Path(self.base_path) / path).resolve()
 
-                line_split: List[str] = INCLUDE_SYNTAX.split(line)
-                output: List[str] = []
-                if len(markmap) == 0:
-                    output.append("")
-                else:
-                    output.append('<pre class="language-markmap"><code encoding="base64">')
-                    output.append(base64.b64encode(markmap.encode()).decode())
-                    output.append("</code></pre>")
+            self.on_include(path)
+            if path in included_paths:
+                log.warning(f"loop detected while including: {path}")
+                position = match.end()
+                continue
 
-                if line_split[0].strip() != "":
-                    output.insert(0, line_split[0])
+            included_paths.add(path)
+            try:
+                include: CachedInclude = INCLUDE_CACHE.get(path, self.encoding)
 
-                if line_split[2].strip() != "":
-                    output.append(line_split[2])
+            except Exception as e:
+                log.error("unable to include file {}. Ignoring statement. Error: {}".format(path, e))
+                line = line[:match.start()] + line[match.end():]
+                position = match.start()
+                continue
 
-                lines = lines[:loc] + output + lines[loc+1:]
-                break
+            before: str = line[:match.start()]
+            after: str = line[match.end():]
+            if before.strip() != "":
+                output.append(before)
 
+            STATS.count("includes_expanded")
+            if len(include.text) == 0:
+                output.append("")
             else:
-                done = True
+                # raw html, because placeholders would not survive normalize_whitespace
+                output.extend(("", self._render(include.text, include.payload(self.payload_encoding)), ""))
+
+            if after.strip() == "":
+                return
 
-        return lines
+            line = after
+            position = 0
+
+
+class MarkmapFencePreprocessor(MarkmapPreprocessor):
+    """
+    Replaces markmap code fences with their final markup, if superfences is not available.
+    """
+
+    def run(self, lines: List[str]) -> List[str]:
+        if not any("markmap" in line for line in lines):
+            return lines
+
+        with STATS.measure("MarkmapFencePreprocessor.run"):
+            new_lines: List[str] = []
+            index: int = 0
+            while index < len(lines):
+                match: Optional[re.Match] = FENCE_SYNTAX.match(lines[index])
+                end: Optional[int] = _fence_end(lines, index + 1, match.group("fence")) if match else None
+                if end is None:
+                    new_lines.append(lines[index])
+                    index += 1
+                    continue
+
+                if MARKMAP_INFO_SYNTAX.match(match.group("info")):
+                    markup: str = self._render("\n".join(lines[index + 1:end]).strip())
+                    new_lines.extend(["", self.md.htmlStash.store(markup), ""])
+                else:
+                    # other fences are kept as they are, including markmap examples nested into them
+                    new_lines.extend(lines[index:end + 1])
+                index = end + 1
+
+            return new_lines
+
+
+def _fence_end(lines: List[str], start: int, fence: str) -> Optional[int]:
+    for index in range(start, len(lines)):
+        if lines[index].rstrip(" ") == fence:
+            return index
+
+    return None
+
+
+def _superfences_formatter(
+    src: str,
+    language: str,
+    options: Dict[str, str],
+    md: Markdown,
+    on_markmap: Callable[[], None],
+    transform: bool = False,
+    prerender: bool = False,
+    payload_encoding: str = "base64",
+    **kwargs,
+) -> str:
+    on_markmap()
+
+    with STATS.measure("superfences formatter"):
+        return render_markmap(
+            src.strip(),
+            transform=transform,
+            prerender=prerender,
+            payload_encoding=payload_encoding,
+        )
 
 
 class MarkmapExtension(Extension):
@@ -85,29 +320,60 @@ class MarkmapExtension(Extension):
         "base_path": ["docs", "Default location from which to evaluate relative paths for the include statement."],
         "encoding": ["utf-8", "Encoding of the files used by the include statement."],
         "file_extension": [".mm.md", "File extension of mindmap files"],
+        "transform": [False, "Transform markmaps into node trees at build time instead of in the browser."],
+        "prerender": [False, "Embed a static svg of each markmap, which is made interactive on first use."],
+        "payload_encoding": ["base64", "Encoding of embedded markmaps: base64, deflate or json."],
+        # a default of None would be parsed as boolean by markdown
+        "on_markmap": [lambda: None, "Callback invoked whenever a markmap is rendered."],
+        "on_include": [lambda path: None, "Callback invoked with the resolved path of every include statement."],
+        "skip_includes": [lambda: False, "Callback telling whether the page is known to contain no include statement."],
     }
 
     def __init__(self, **configs: Dict[str, str]):
-        self.config: Dict[str, str] = self.config_defaults
+        # copied, since setConfig modifies the values in place
+        self.config: Dict[str, str] = {key: list(value) for key, value in self.config_defaults.items()}
         for key, value in configs.items():
             self.setConfig(key, value)
 
+    def _extend_super_fences(self, extension: Extension) -> bool:
+        try:
+            from pymdownx.superfences import default_validator, _validator
+            args = (
+                "markmap",
+                partial(
+                    _superfences_formatter,
+                    on_markmap=self.getConfig("on_markmap"),
+                    transform=self.getConfig("transform"),
+                    prerender=self.getConfig("prerender"),
+                    payload_encoding=self.getConfig("payload_encoding"),
+                ),
+                partial(_validator, validator=default_validator),
+            )
+            try:
+                extension.extend_super_fences(*args, None)
+
+            except TypeError:
+                # older versions of pymdownx do not support the reset argument
+                extension.extend_super_fences(*args)
+
+            return True
+
+        except ImportError as e:
+            log.warning(f"markmap detected pymdownx.superfences, but import is not working: {e}")
+
+        except Exception as e:
+            log.error(f"unexpected error: {e}")
+
+        return False
+
     def extendMarkdown(self, md: Markdown) -> None:
         md.preprocessors.register(MarkmapPreprocessor(md, self.getConfigs()), "include_markmap", 102)
         for extension in md.registeredExtensions:
             if extension.__class__.__name__ == "SuperFencesCodeExtension":
                 log.debug(f"superfences detected by markmap")
-                try:
-                    from pymdownx.superfences import default_validator, fence_code_format, _formatter, _validator
-                    extension.extend_super_fences(
-                        "markmap",
-                        partial(_formatter, class_name="language-markmap", _fmt=fence_code_format),
-                        partial(_validator, validator=default_validator)
-                    )
+                if self._extend_super_fences(extension):
                     break
 
-                except ImportError as e:
-                    log.warning(f"markmap detected pymdownx.superfences, but import is not working: {e}")
-
-                except Exception as e:
-                    log.error(f"unexpected error: {e}")
+        else:
+            # runs after normalize_whitespace (30) and before fenced_code (25)
+            md.preprocessors.register(MarkmapFencePreprocessor(md, self.getConfigs()), "fence_markmap", 27)
@@ -1,19 +1,43 @@
-import base64
+from collections import defaultdict
+from functools import lru_cache, wraps
+import hashlib
+from html import escape
+import json
 import logging
 from pathlib import Path
 import re
-from typing import Dict, Tuple
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
 
-from bs4 import BeautifulSoup, ResultSet, Tag
 from mkdocs.config.base import Config, load_config
-from mkdocs.config.config_options import Type as PluginType
-from mkdocs.plugins import BasePlugin
+from mkdocs.config.config_options import Choice, Type as PluginType
+from mkdocs.plugins import BasePlugin, CombinedEvent, event_priority
+from mkdocs.structure.nav import Navigation
+from mkdocs.structure.files import Files
 from mkdocs.structure.pages import Page
+from mkdocs.utils import write_file
 
-from mkdocs_markmap.extension import MarkmapExtension
+# livereload imports its http server and file watcher, which builds do not need
+if TYPE_CHECKING:
+    from mkdocs.livereload import LiveReloadServer
 
+from mkdocs_markmap.extension import (
+    INCLUDE_CACHE,
+    MARKMAP_CLASS,
+    PAYLOAD_ENCODINGS,
+    MarkmapExtension,
+    decode_markmap,
+    encode_markmap,
+)
+
+from .__meta__ import PROJECT_VERSION
+from .cache import PAGE_CACHE_DIR, PageCache
 from .defaults import MARKMAP
-from .utils import download
+from .scan import SourceScan, scan_sources
+from .split import count_nodes, split_tree
+from .stats import PROFILERS, STATS
+from .svg import prerender_tree
+from .transform import TRANSFORM_CACHE, outline
+from .utils import fetch_all, get_cache_dir, get_sub_path, inject_tags, install_cached, write_compressed
 
 
 log = logging.getLogger("mkdocs.markmap")
@@ -22,10 +46,80 @@ log = logging.getLogger("mkdocs.markmap")
 STATICS_PATH: Path = Path(__file__).parent / "static_files"
 STYLE_PATH: Path = STATICS_PATH / "mkdocs-markmap.css"
 SCRIPT_PATH: Path = STATICS_PATH / "mkdocs-markmap.js"
+WORKER_PATH: Path = STATICS_PATH / "mkdocs-markmap-worker.js"
+ASSETS_DIR: str = "assets"
+DATA_DIR: str = "markmap-data"
+
+MARKMAP_DATA_SYNTAX = re.compile(r"<markmap-data(?P<attributes>[^>]*)>(?P<payload>.*?)</markmap-data>", re.DOTALL)
+DATA_ATTRIBUTE_SYNTAX = re.compile(r'\s(?P<name>encoding|format)="(?P<value>[^"]*)"')
+STATIC_SVG_SYNTAX = re.compile(r'<svg class="markmap-static".*?</svg>', re.DOTALL)
+STATIC_MARKMAP_DATA_SYNTAX = re.compile(
+    r'(?P<svg><svg class="markmap-static"(?:(?!</svg>).)*</svg>)?' + MARKMAP_DATA_SYNTAX.pattern,
+    re.DOTALL,
+)
 
 VERSION_KEY = "{name}_version"
 
 
+class IncludeGraph(object):
+    """
+    Reverse dependency graph of included mindmaps, mapping each include to the pages including it
+    """
+
+    def __init__(self):
+        self._dependents: Dict[Path, Set[str]] = defaultdict(set)
+        self._dependencies: Dict[str, Set[Path]] = defaultdict(set)
+
+    def add(self, include: Path, page: str) -> None:
+        self._dependents[include].add(page)
+        self._dependencies[page].add(include)
+
+    def reset(self, page: str) -> None:
+        for include in self._dependencies.pop(page, ()):
+            self._dependents[include].discard(page)
+            if not self._dependents[include]:
+                del self._dependents[include]
+
+    def dependents(self, include: Path) -> Set[str]:
+        return set(self._dependents.get(include, ()))
+
+    def dependencies(self, page: str) -> Set[Path]:
+        return set(self._dependencies.get(page, ()))
+
+    @property
+    def includes(self) -> Set[Path]:
+        return set(self._dependents)
+
+
+# shared across plugin instances, since mkdocs serve reloads the config on every rebuild
+INCLUDE_GRAPH: IncludeGraph = IncludeGraph()
+
+
+def instrumented(method: Callable) -> Callable:
+    """
+    Accumulates the wall time of a plugin hook, if stats are enabled
+    """
+    name: str = f"MarkmapPlugin.{method.__name__}"
+
+    @wraps(method)
+    def wrapper(*args, **kwargs) -> Any:
+        with STATS.measure(name):
+            return method(*args, **kwargs)
+
+    return wrapper
+
+
+@lru_cache(maxsize=None)
+def read_static(path: Path) -> Tuple[str, str]:
+    """
+    Provides content and content-hashed file name of a static file, read once per process
+    """
+    content: str = path.read_text()
+    digest: str = hashlib.sha256(content.encode()).hexdigest()[:8]
+
+    return content, f"{path.stem}.{digest}{path.suffix}"
+
+
 class MarkmapPlugin(BasePlugin):
     """
     Plugin for markmap support
@@ -38,10 +132,47 @@ class MarkmapPlugin(BasePlugin):
         ("base_path", PluginType(str, default="docs")),
         ("encoding", PluginType(str, default="utf-8")),
         ("file_extension", PluginType(str, default=".mm.md")),
+        ("inline_statics", PluginType(bool, default=True)),
+        ("cache_dir", PluginType(str, default="")),
+        ("offline", PluginType(bool, default=False)),
+        ("transform", PluginType(bool, default=False)),
+        ("transform_workers", PluginType(int, default=1)),
+        ("prerender", PluginType(bool, default=False)),
+        ("payload_encoding", Choice(PAYLOAD_ENCODINGS, default="base64")),
+        ("externalize", PluginType(bool, default=False)),
+        ("externalize_threshold", PluginType(int, default=1024)),
+        ("chunk_depth", PluginType(int, default=0)),
+        ("chunk_threshold", PluginType(int, default=1000)),
+        ("page_cache", PluginType(bool, default=False)),
+        ("page_cache_dir", PluginType(str, default=PAGE_CACHE_DIR)),
+        ("page_cache_size", PluginType(int, default=100)),
+        ("clear_page_cache", PluginType(bool, default=False)),
+        ("lazy_root_margin", PluginType(str, default="200px")),
+        ("worker", PluginType(bool, default=False)),
+        ("script_loading", Choice(("blocking", "defer", "lazy"), default="blocking")),
+        ("bundle", PluginType(bool, default=False)),
+        ("stats", PluginType(bool, default=False)),
+        ("stats_file", PluginType(str, default="")),
+        ("profile", Choice(PROFILERS, default="none")),
+        ("profile_file", PluginType(str, default="")),
     )
 
     def __init__(self):
         self._markmap: Dict[str, str] = None
+        self._markmaps_found: int = 0
+        self._found_any_markmap: bool = False
+        self._fetched: Dict[str, Optional[Tuple[Path, str]]] = {}
+        self._scripts: Dict[str, str] = {}
+        self._current_page: Optional[Page] = None
+        self._skip_includes: bool = False
+        self._bundles: Dict[Tuple[str, ...], str] = {}
+        self._bundle_failed: bool = False
+        self._index: Dict[str, SourceScan] = {}
+        self._data_files: Dict[str, str] = {}
+        self._chunked: Dict[str, Tuple[Optional[str], List[str], str]] = {}
+        self._page_files: Set[str] = set()
+        self._page_cache: Optional[PageCache] = None
+        self._outlines: Dict[str, str] = {}
 
     @property
     def markmap(self) -> Dict[str, str]:
@@ -56,66 +187,575 @@ class MarkmapPlugin(BasePlugin):
 
         return self._markmap
 
-    def _load_scripts(self, soup: BeautifulSoup, script_base_url: str, js_path: Path) -> None:
-        for script_url in self.markmap.values():
-            if script_url.lower().startswith("http"):
-                try:
-                    src: str = script_base_url + download(js_path, script_url, extname=".js")
-                except Exception as e:
-                    log.error(f"unable to download script: {script_url}")
-                    src = script_url
+    @property
+    def include_graph(self) -> IncludeGraph:
+        """
+        Provides the pages depending on each included mindmap
+        """
+        return INCLUDE_GRAPH
 
-            else:
+    def _prefetch_scripts(self) -> None:
+        remote_urls: List[str] = [url for url in self.markmap.values() if url.lower().startswith("http")]
+        cache_dir: Path = Path(self.config["cache_dir"]) if self.config["cache_dir"] else get_cache_dir()
+        self._fetched = fetch_all(remote_urls, cache_dir, offline=self.config["offline"])
+
+    def _install_scripts(self, js_path: Path) -> None:
+        self._scripts = {}
+        for url, cached in self._fetched.items():
+            if cached is None:
+                continue
+
+            sub_path: str = get_sub_path(url, extname=".js")
+            try:
+                install_cached(*cached, js_path / sub_path)
+                self._scripts[url] = sub_path
+            except Exception as e:
+                log.error(f"unable to install script: {url} ({e})")
+
+    def _get_script_srcs(self, script_base_url: str, runtime_transform: bool = True) -> List[str]:
+        srcs: List[str] = []
+        for name, script_url in self.markmap.items():
+            if name == "lib" and not runtime_transform:
+                continue
+
+            if not script_url.lower().startswith("http"):
                 log.info(f"static script detected: {script_url}")
-                src = script_url
+            srcs.append(self._get_script_src(script_base_url, script_url))
 
-            script: Tag = soup.new_tag("script", src=src, type="text/javascript")
-            soup.head.append(script)
+        return srcs
 
-    @staticmethod
-    def _add_statics(soup: BeautifulSoup):
-        statics = (
-            (STYLE_PATH, "style", "text/css", "head"),
-            (SCRIPT_PATH, "script", "text/javascript", "body"),
-        )
+    def _load_scripts(self, srcs: List[str]) -> List[str]:
+        loading: str = self.config["script_loading"]
+        if loading == "lazy":
+            # loaded by mkdocs-markmap.js once the first markmap approaches the viewport
+            return []
+
+        if loading == "defer":
+            return [
+                *(f'<link href="{escape(src)}" rel="preload" as="script">' for src in srcs),
+                *(f'<script defer src="{escape(src)}" type="text/javascript"></script>' for src in srcs),
+            ]
 
-        for path, tag_name, text_type, attribute in statics:
-            tag: Tag = soup.new_tag(tag_name, type=text_type)
-            with open(path, "r") as fp:
-                tag.string = fp.read()
-            getattr(soup, attribute).append(tag)
+        return [f'<script src="{escape(src)}" type="text/javascript"></script>' for src in srcs]
+
+    def _get_script_src(self, script_base_url: str, script_url: str) -> str:
+        sub_path: Optional[str] = self._scripts.get(script_url)
+        if sub_path is None:
+            return script_url
+
+        return script_base_url + sub_path
+
+    def _bundle_scripts(self, site_path: Path, runtime_transform: bool = True) -> Optional[str]:
+        """
+        Provides the name of a bundle containing all libraries and mkdocs-markmap.js, created once per build
+        """
+        sub_paths: List[Optional[str]] = [
+            self._scripts.get(script_url)
+            for name, script_url in self.markmap.items()
+            if name != "lib" or runtime_transform
+        ]
+        if None in sub_paths:
+            log.warning("unable to bundle scripts, which are not available locally")
+            self._bundle_failed = True
+            return None
+
+        key: Tuple[str, ...] = tuple(sub_paths)
+        if key not in self._bundles:
+            js_path: Path = site_path / "js"
+            parts: List[bytes] = [(js_path / sub_path).read_bytes() for sub_path in sub_paths]
+            parts.append(read_static(SCRIPT_PATH)[0].encode())
+            content: bytes = b"\n;\n".join(parts)
+            name: str = f"mkdocs-markmap-bundle.{hashlib.sha256(content).hexdigest()[:8]}.js"
+            write_compressed(site_path / ASSETS_DIR / name, content)
+            log.debug(f"scripts bundled: {name}")
+            self._bundles[key] = name
+
+        return self._bundles[key]
+
+    def _add_statics(self, base_url: str, srcs: List[str], bundle: Optional[str] = None) -> Tuple[List[str], List[str]]:
+        style, style_name = read_static(STYLE_PATH)
+        script, script_name = read_static(SCRIPT_PATH)
+        settings: str = f'data-root-margin="{escape(self.config["lazy_root_margin"])}"'
+        # libraries are already available when mkdocs-markmap.js is executed as part of the bundle
+        script_loading: str = "blocking" if bundle is not None else self.config["script_loading"]
+        settings += f' data-script-loading="{script_loading}"'
+        if script_loading == "lazy":
+            settings += f' data-scripts="{escape(" ".join(srcs))}"'
+        if self.config["worker"]:
+            worker_src: str = f"{base_url}js/{read_static(WORKER_PATH)[1]}"
+            settings += f' data-worker="{escape(worker_src)}"'
+            if "lib" in self.markmap:
+                lib_src: str = self._get_script_src(base_url + "js/", self.markmap["lib"])
+                settings += f' data-worker-lib="{escape(lib_src)}"'
+        assets_url: str = f"{base_url}{ASSETS_DIR}/"
+        if bundle is not None:
+            defer: str = "" if self.config["script_loading"] == "blocking" else "defer "
+            script_tag: str = f'<script {defer}{settings} src="{escape(assets_url + bundle)}" type="text/javascript"></script>'
+        elif self.config["inline_statics"]:
+            script_tag = f'<script {settings} type="text/javascript">{script}</script>'
+        else:
+            script_tag = f'<script {settings} src="{escape(assets_url + script_name)}" type="text/javascript"></script>'
+
+        if self.config["inline_statics"]:
+            return [f'<style type="text/css">{style}</style>'], [script_tag]
+
+        return [f'<link href="{escape(assets_url + style_name)}" rel="stylesheet" type="text/css">'], [script_tag]
 
     def on_config(self, config: Config) -> Config:
+        if self.config["stats"] or self.config["profile"] != "none":
+            STATS.start(profiler=self.config["profile"])
+        else:
+            STATS.stop()
+
+        cache_path: Path = Path(self.config["page_cache_dir"])
+        if self.config["clear_page_cache"]:
+            PageCache(cache_path).clear()
+        if self.config["page_cache"]:
+            self._page_cache = PageCache(cache_path, max_size=self.config["page_cache_size"] * 1024 * 1024)
+
         config["markdown_extensions"].append("markmap")
         config["mdx_configs"]["markmap"] = {
             key: value
             for key, value in config["plugins"].get("markmap").config.items()
             if key in MarkmapExtension.config_defaults
         }
+        config["mdx_configs"]["markmap"]["on_markmap"] = self._on_markmap
+        config["mdx_configs"]["markmap"]["on_include"] = self._on_include
+        config["mdx_configs"]["markmap"]["skip_includes"] = lambda: self._skip_includes
         self.config["extra_javascript"] = config.get("extra_javascript", [])
 
         return config
 
+    def _on_markmap(self) -> None:
+        self._markmaps_found += 1
+        STATS.count("markmaps_found")
+
+    def _on_include(self, path: Path) -> None:
+        if self._current_page is not None:
+            INCLUDE_GRAPH.add(path, self._current_page.file.src_path)
+
+    def _prepare_transform(self) -> None:
+        includes: Set[Path] = {include for scan in self._index.values() for include in scan.includes}
+        contents: List[str] = []
+        for path in includes:
+            try:
+                contents.append(INCLUDE_CACHE.get(path, self.config["encoding"]).text)
+            except Exception as e:
+                log.debug(f"unable to read mindmap for transformation: {path} ({e})")
+        TRANSFORM_CACHE.prepare(contents, workers=self.config["transform_workers"])
+
+    @instrumented
+    def on_files(self, files: Files, config: Config) -> Files:
+        # includes are read off the serial render path, and dependencies are known before the first render
+        sources: Dict[str, Path] = {file.src_path: Path(file.abs_src_path) for file in files.documentation_pages()}
+        self._index = scan_sources(
+            sources,
+            Path(self.config["base_path"]),
+            self.config["file_extension"],
+            self.config["encoding"],
+            payload_encoding=None if self.config["transform"] else self.config["payload_encoding"],
+        )
+        for src_path, scan in self._index.items():
+            INCLUDE_GRAPH.reset(src_path)
+            for include in scan.includes:
+                INCLUDE_GRAPH.add(include, src_path)
+
+        if self.config["transform"] and self.config["transform_workers"] > 1:
+            self._prepare_transform()
+
+        # enforce rendering pages with modified includes when building dirty
+        for file in files.documentation_pages():
+            dest_path: Path = Path(file.abs_dest_path)
+            if not dest_path.is_file():
+                continue
+            dest_mtime: float = dest_path.stat().st_mtime
+            for include in INCLUDE_GRAPH.dependencies(file.src_path):
+                try:
+                    modified: bool = include.stat().st_mtime > dest_mtime
+                except OSError:
+                    modified = True
+                if modified:
+                    log.debug(f"include modified, rendering {file.src_path}: {include}")
+                    file.is_modified = lambda: True
+                    break
+
+        return files
+
+    @instrumented
+    def on_serve(self, server: "LiveReloadServer", config: Config, builder: Callable, **kwargs) -> "LiveReloadServer":
+        docs_dir: Path = Path(config["docs_dir"]).resolve()
+        watched: Set[Path] = {Path(self.config["base_path"]).resolve()}
+        watched.update(include.parent for include in INCLUDE_GRAPH.includes)
+        for path in sorted(watched):
+            if path.is_dir() and docs_dir not in (path, *path.parents):
+                log.debug(f"watching includes: {path}")
+                server.watch(str(path))
+
+        return server
+
+    @instrumented
     def on_post_page(self, html: str, page: Page, config: Config, **kwargs) -> str:
         if not getattr(page, "_found_markmap", False):
             log.debug(f"no markmap found: {page.file.name}")
+            STATS.count("pages_skipped")
             return html
 
         log.info(f"markmap found: {page.file.name}")
-        soup: BeautifulSoup = BeautifulSoup(html, "html.parser")
-        script_base_url: str = re.sub(r"/[^/]*$", "/", re.sub(r"[^/]+?/", "../", re.sub(r"/+?", "/", page.url))) + "js/"
-        js_path: Path = Path(config["site_dir"]) / "js"
-        self._load_scripts(soup, script_base_url, js_path)
-        self._add_statics(soup)
+        STATS.count("pages_processed")
+        if not self._found_any_markmap:
+            # scripts are installed by the first page containing a markmap, site_dir has been cleaned by then
+            self._install_scripts(Path(config["site_dir"]) / "js")
+            self._found_any_markmap = True
+        if self._page_cache is None:
+            html, head, body = self._process_page(html, page, config)
+            return inject_tags(html, head=head, body=body)
+
+        # the remaining page may change with every build (e.g. by a build date), markmaps are cached only
+        site_path: Path = Path(config["site_dir"])
+        runtime_transform: bool = getattr(page, "_markmap_runtime", True)
+        elements: List[str] = [match.group(0) for match in STATIC_MARKMAP_DATA_SYNTAX.finditer(html)]
+        key: str = self._page_cache_key("post_page", page.url, str(runtime_transform), *elements)
+        entry: Optional[Dict] = self._page_cache.get(key)
+        if entry is not None and self._restore_files(entry["files"], site_path):
+            STATS.count("cache_hits")
+            if self.config["bundle"]:
+                # the bundle is written once per build, even if all pages are cached
+                self._bundle_scripts(site_path, runtime_transform)
+            replacements: Iterator[str] = iter(entry["elements"])
+            html = STATIC_MARKMAP_DATA_SYNTAX.sub(lambda match: next(replacements), html)
+            return inject_tags(html, head=entry["head"], body=entry["body"])
 
-        return str(soup)
+        self._page_files = set()
+        html, head, body = self._process_page(html, page, config)
+        for name in self._page_files:
+            self._page_cache.store_blob(name, site_path / DATA_DIR / name)
+        self._page_cache.set(key, {
+            "elements": [match.group(0) for match in STATIC_MARKMAP_DATA_SYNTAX.finditer(html)],
+            "head": head,
+            "body": body,
+            "files": sorted(self._page_files),
+        })
 
+        return inject_tags(html, head=head, body=body)
+
+    def _page_cache_key(self, *parts: str) -> str:
+        """
+        Provides the cache key of a page, which depends on plugin version, configuration and libraries as well
+        """
+        scripts: Dict[str, Optional[str]] = {url: cached and cached[1] for url, cached in self._fetched.items()}
+        return PageCache.key(
+            PROJECT_VERSION,
+            json.dumps(dict(self.config), sort_keys=True, default=str),
+            json.dumps(scripts, sort_keys=True),
+            *parts,
+        )
+
+    def _restore_files(self, names: List[str], site_path: Path) -> bool:
+        """
+        Restores data files of a cached page, which have not been written to site_dir yet
+        """
+        for name in names:
+            file_path: Path = site_path / DATA_DIR / name
+            if file_path.exists():
+                continue
+
+            content: Optional[bytes] = self._page_cache.load_blob(name)
+            if content is None:
+                return False
+            write_compressed(file_path, content)
+
+        return True
+
+    def _process_page(self, html: str, page: Page, config: Config) -> Tuple[str, List[str], List[str]]:
+        """
+        Provides the page with processed markmaps, along with the tags to be added to head and body
+        """
+        base_url: str = re.sub(r"/[^/]*$", "/", re.sub(r"[^/]+?/", "../", re.sub(r"/+?", "/", page.url)))
+        runtime_transform: bool = getattr(page, "_markmap_runtime", True)
+        srcs: List[str] = self._get_script_srcs(base_url + "js/", runtime_transform)
+        bundle: Optional[str] = None
+        if self.config["bundle"]:
+            bundle = self._bundle_scripts(Path(config["site_dir"]), runtime_transform)
+        head: List[str] = self._load_scripts(srcs) if bundle is None else []
+        statics_head, statics_body = self._add_statics(base_url, srcs, bundle)
+        if self.config["transform"]:
+            html = self._split_markmaps(html, base_url, Path(config["site_dir"]))
+        if self.config["externalize"]:
+            html = self._externalize_markmaps(html, base_url, Path(config["site_dir"]))
+
+        return html, head + statics_head, statics_body
+
+    def _write_data_file(self, payload: str, encoding: str, tree: bool, site_path: Path) -> str:
+        """
+        Provides the name of a file containing the decoded payload as json, written once per build
+        """
+        key: str = hashlib.sha256(f"{encoding}:{tree}:{payload}".encode()).hexdigest()
+        if key not in self._data_files:
+            markmap: str = decode_markmap(payload, encoding, tree=tree)
+            content: str = markmap if tree else json.dumps(markmap, ensure_ascii=False)
+            self._data_files[key] = self._write_json(content, site_path)
+
+        self._page_files.add(self._data_files[key])
+        return self._data_files[key]
+
+    @staticmethod
+    def _write_json(content: str, site_path: Path) -> str:
+        data: bytes = content.encode()
+        name: str = f"{hashlib.sha256(data).hexdigest()}.json"
+        file_path: Path = site_path / DATA_DIR / name
+        if not file_path.exists():
+            write_compressed(file_path, data)
+            log.debug(f"markmap data written: {name}")
+
+        return name
+
+    def _split_tree(self, payload: str, encoding: str, site_path: Path) -> Tuple[Optional[str], str]:
+        """
+        Provides the payload and static svg of the top levels of a large node tree (if split), written once per build
+        """
+        key: str = hashlib.sha256(f"{encoding}:{payload}".encode()).hexdigest()
+        if key not in self._chunked:
+            data: Dict = json.loads(decode_markmap(payload, encoding, tree=True))
+            options: Dict = (data.get("frontmatter") or {}).get("markmap") or {}
+            depth: int = self.config["chunk_depth"]
+            if isinstance(options, dict) and "chunkDepth" in options:
+                depth = int(options["chunkDepth"])
+            elif count_nodes(data["root"]) <= self.config["chunk_threshold"]:
+                depth = 0
+
+            split: Optional[str] = None
+            names: List[str] = []
+            svg: str = ""
+            if depth > 0:
+                def write_chunk(chunk: List[Dict]) -> str:
+                    name: str = self._write_json(
+                        json.dumps(chunk, separators=(",", ":"), ensure_ascii=False),
+                        site_path,
+                    )
+                    names.append(name)
+                    return name
+
+                data["root"] = split_tree(data["root"], depth, write_chunk)
+                content: str = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+                split = encode_markmap(content, encoding, tree=True)
+                if self.config["prerender"]:
+                    # the static svg shows the embedded levels only, like the interactive markmap
+                    svg = prerender_tree(data)
+            self._chunked[key] = (split, names, svg)
+
+        split, names, svg = self._chunked[key]
+        self._page_files.update(names)
+        return split, svg
+
+    def _split_markmaps(self, html: str, base_url: str, site_path: Path) -> str:
+        """
+        Splits large node trees by depth, deeper levels are fetched by mkdocs-markmap.js once expanded
+        """
+        def replace(match: re.Match) -> str:
+            attributes: Dict[str, str] = dict(DATA_ATTRIBUTE_SYNTAX.findall(match.group("attributes")))
+            if attributes.get("format") != "tree" or attributes.get("encoding") not in PAYLOAD_ENCODINGS:
+                return match.group(0)
+
+            try:
+                payload, svg = self._split_tree(match.group("payload"), attributes["encoding"], site_path)
+            except Exception as e:
+                log.warning(f"unable to split markmap, keeping it whole: {e}")
+                return match.group(0)
+
+            if payload is None:
+                return match.group(0)
+
+            chunks: str = f' data-chunks="{escape(base_url + DATA_DIR + "/")}"'
+            if match.group("svg") is None:
+                svg = ""
+            return f'{svg}<markmap-data{match.group("attributes")}{chunks}>{payload}</markmap-data>'
+
+        return STATIC_MARKMAP_DATA_SYNTAX.sub(replace, html)
+
+    def _externalize_markmaps(self, html: str, base_url: str, site_path: Path) -> str:
+        """
+        Moves large payloads into content-addressed files, which are shared by all pages and cached by browsers
+        """
+        def replace(match: re.Match) -> str:
+            payload: str = match.group("payload")
+            if len(payload) < self.config["externalize_threshold"]:
+                return match.group(0)
+
+            attributes: Dict[str, str] = dict(DATA_ATTRIBUTE_SYNTAX.findall(match.group("attributes")))
+            tree: bool = attributes.get("format") == "tree"
+            try:
+                name: str = self._write_data_file(payload, attributes.get("encoding", ""), tree, site_path)
+            except Exception as e:
+                log.warning(f"unable to externalize markmap, keeping it inline: {e}")
+                return match.group(0)
+
+            others: str = DATA_ATTRIBUTE_SYNTAX.sub("", match.group("attributes"))
+            src: str = f"{base_url}{DATA_DIR}/{name}"
+            format_attribute: str = ' format="tree"' if tree else ""
+            return f'<markmap-data encoding="json"{format_attribute}{others} data-src="{escape(src)}"></markmap-data>'
+
+        return MARKMAP_DATA_SYNTAX.sub(replace, html)
+
+    @instrumented
+    def on_pre_build(self, config: Config) -> None:
+        self._found_any_markmap = False
+        self._scripts = {}
+        self._bundles = {}
+        self._bundle_failed = False
+        self._data_files = {}
+        self._chunked = {}
+        self._outlines = {}
+        self._page_files = set()
+        self._prefetch_scripts()
+
+    def _search_outline(self, match: re.Match) -> str:
+        """
+        Replaces the payload of a markmap by the plain text outline of its labels
+        """
+        payload: str = match.group("payload")
+        attributes: Dict[str, str] = dict(DATA_ATTRIBUTE_SYNTAX.findall(match.group("attributes")))
+        tree: bool = attributes.get("format") == "tree"
+        key: str = hashlib.sha256(f"{attributes.get('encoding')}:{tree}:{payload}".encode()).hexdigest()
+        if key not in self._outlines:
+            try:
+                markmap: str = decode_markmap(payload, attributes.get("encoding", ""), tree=tree)
+                data: Dict = json.loads(markmap if tree else TRANSFORM_CACHE.get(markmap))
+                self._outlines[key] = escape("\n".join(outline(data["root"])))
+            except Exception as e:
+                log.debug(f"unable to outline markmap for search: {e}")
+                self._outlines[key] = ""
+
+        return f'<markmap-data{match.group("attributes")}>{self._outlines[key]}</markmap-data>'
+
+    @event_priority(100)
+    @instrumented
+    def _on_page_context_search(self, context: Dict, page: Page, config: Config, nav: Navigation) -> Dict:
+        # search plugins index page.content, which is restored once they are done
+        if not getattr(page, "_found_markmap", False) or not any("search" in name for name in config["plugins"]):
+            return context
+
+        setattr(page, "_markmap_content", page.content)
+        page.content = STATIC_SVG_SYNTAX.sub("", MARKMAP_DATA_SYNTAX.sub(self._search_outline, page.content))
+        setattr(page, "_markmap_outline", page.content)
+
+        return context
+
+    @event_priority(-100)
+    def _on_page_context_restore(self, context: Dict, page: Page, config: Config, nav: Navigation) -> Dict:
+        content: Optional[str] = getattr(page, "_markmap_content", None)
+        if content is None:
+            return context
+
+        # changes of other plugins are kept, even though the page is left with outlines then
+        if page.content == getattr(page, "_markmap_outline", None):
+            page.content = content
+        else:
+            log.debug(f"page content changed by another plugin, markmaps not restored: {page.file.name}")
+        setattr(page, "_markmap_content", None)
+        setattr(page, "_markmap_outline", None)
+
+        return context
+
+    on_page_context = CombinedEvent(_on_page_context_search, _on_page_context_restore)
+
+    def on_post_build(self, config: Config) -> None:
+        with STATS.measure("MarkmapPlugin.on_post_build"):
+            self._write_statics(config)
+            if self._page_cache is not None:
+                log.debug(f"page cache hits: {self._page_cache.hits}, misses: {self._page_cache.misses}")
+                self._page_cache.prune()
+
+        if STATS.enabled:
+            self._report_stats()
+
+    def _report_stats(self) -> None:
+        if self.config["stats"]:
+            STATS.log_summary()
+        if self.config["stats_file"]:
+            STATS.write_report(Path(self.config["stats_file"]))
+        if self.config["profile"] != "none":
+            default: str = "mkdocs-markmap.prof" if self.config["profile"] == "cprofile" else "mkdocs-markmap-tracemalloc.txt"
+            STATS.dump_profile(Path(self.config["profile_file"] or default))
+        STATS.stop()
+
+    def _write_statics(self, config: Config) -> None:
+        if not self._found_any_markmap:
+            return
+
+        statics: List[Tuple[Path, Path]] = []
+        if not self.config["inline_statics"]:
+            assets_path: Path = Path(config["site_dir"]) / ASSETS_DIR
+            statics.append((STYLE_PATH, assets_path))
+            # the bundle contains the script already, unless pages fell back to separate scripts
+            if not self.config["bundle"] or self._bundle_failed:
+                statics.append((SCRIPT_PATH, assets_path))
+        if self.config["worker"]:
+            statics.append((WORKER_PATH, Path(config["site_dir"]) / "js"))
+
+        for path, target_path in statics:
+            content, name = read_static(path)
+            write_file(content.encode(), str(target_path / name))
+            log.debug(f"static file written: {name}")
+
+    # runs after other plugins, which may add include statements to the scanned source
+    @event_priority(-100)
+    @instrumented
+    def on_page_markdown(self, markdown: str, page: Page, **kwargs) -> str:
+        self._markmaps_found = 0
+        self._current_page = page
+        INCLUDE_GRAPH.reset(page.file.src_path)
+        # page.markdown holds the source, until all plugins are done
+        scan: Optional[SourceScan] = self._index.get(page.file.src_path)
+        self._skip_includes = scan is not None and not scan.includes and markdown == page.markdown
+
+        return markdown
+
+    @instrumented
     def on_page_content(self, html: str, page: Page, **kwargs) -> str:
+        found_markmap: bool = self._markmaps_found > 0
+        self._markmaps_found = 0
+        self._current_page = None
+        self._skip_includes = False
+
+        # markmaps rendered by MarkmapExtension are final, only foreign markup requires parsing
+        if "language-markmap" in html:
+            html, found_legacy = self._transform_legacy_markmaps_cached(html)
+            found_markmap = found_markmap or found_legacy
+            setattr(page, "_markmap_runtime", found_legacy or not self.config["transform"])
+
+        else:
+            setattr(page, "_markmap_runtime", not self.config["transform"])
+
+        setattr(page, "_found_markmap", found_markmap)
+
+        return html
+
+    def _transform_legacy_markmaps_cached(self, html: str) -> Tuple[str, bool]:
+        if self._page_cache is None:
+            return self._transform_legacy_markmaps(html, self.config["payload_encoding"])
+
+        key: str = self._page_cache_key("page_content", html)
+        entry: Optional[Dict] = self._page_cache.get(key)
+        if entry is not None:
+            STATS.count("cache_hits")
+            return entry["html"], entry["found"]
+
+        html, found = self._transform_legacy_markmaps(html, self.config["payload_encoding"])
+        self._page_cache.set(key, {"html": html, "found": found})
+
+        return html, found
+
+    @staticmethod
+    def _transform_legacy_markmaps(html: str, payload_encoding: str = "base64") -> Tuple[str, bool]:
+        # only pages with markup of other extensions need to be parsed
+        from bs4 import BeautifulSoup, ResultSet, Tag
+
         soup: BeautifulSoup = BeautifulSoup(html, "html.parser")
         markmaps: ResultSet = soup.find_all(class_="language-markmap")
-        setattr(page, "_found_markmap", any(markmaps))
+        if not markmaps:
+            return html, False
 
-        for index, markmap in enumerate(markmaps):
+        for markmap in markmaps:
             markmap: Tag
             pre: Tag
             code: Tag
@@ -126,12 +766,16 @@ class MarkmapPlugin(BasePlugin):
                 pre = markmap.parent
                 code = markmap
             pre.name = "div"
-            pre["class"] = pre.get("class", []) + ["mkdocs-markmap"]
+            pre["class"] = pre.get("class", []) + [MARKMAP_CLASS]
             code.name = "markmap-data"
             code.attrs["hidden"] = "true"
             if not code.attrs.get("encoding"):
-                # Encode content as base64 to avoid being handled by other plugins like KaTeX
-                code.attrs["encoding"] = "base64"
-                code.string = base64.b64encode(code.get_text().strip().encode()).decode()
+                code.attrs["encoding"] = payload_encoding
+                payload: str = encode_markmap(code.get_text().strip(), payload_encoding)
+                if payload_encoding == "json":
+                    code.clear()
+                    code.append(BeautifulSoup(payload, "html.parser"))
+                else:
+                    code.string = payload
 
-        return str(soup)
+        return str(soup), True
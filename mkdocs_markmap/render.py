@@ -0,0 +1,204 @@
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from html import escape
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from markdown import Markdown
+
+from .cache import PAGE_CACHE_DIR, PageCache
+from .defaults import MARKMAP
+from .extension import PAYLOAD_ENCODINGS, MarkmapExtension
+from .utils import fetch_all, get_cache_dir
+
+
+log = logging.getLogger("mkdocs.markmap")
+
+
+STATICS_PATH: Path = Path(__file__).parent / "static_files"
+
+HTML_TEMPLATE: str = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style type="text/css">{style}</style>
+{scripts}
+</head>
+<body>
+{body}
+<script data-script-loading="blocking" type="text/javascript">{script}</script>
+</body>
+</html>
+"""
+
+
+def _inline_script(content: str) -> str:
+    # a closing script tag within the content would end the element early
+    content = content.replace("</script", "<\\/script")
+    return f'<script type="text/javascript">{content}</script>'
+
+
+def load_scripts(transform: bool, cache_dir: Path, offline: bool = False) -> List[str]:
+    """
+    Provides the script tags of all markmap libraries, inlined from the cache if available
+    """
+    urls: List[str] = [
+        module.uri.format(module.version)
+        for name, module in MARKMAP.items()
+        if name != "lib" or not transform
+    ]
+    cached: Dict[str, Optional[Tuple[Path, str]]] = fetch_all(urls, cache_dir, offline=offline)
+
+    scripts: List[str] = []
+    for url in urls:
+        if cached.get(url) is None:
+            scripts.append(f'<script src="{escape(url)}" type="text/javascript"></script>')
+        else:
+            scripts.append(_inline_script(cached[url][0].read_text(encoding="utf-8")))
+
+    return scripts
+
+
+def get_target(source: Path, source_dir: Path, output_dir: Path, file_extension: str) -> Path:
+    relative: Path = source.relative_to(source_dir)
+    if not relative.name.lower().endswith(file_extension):
+        raise ValueError(f"mindmap does not end with {file_extension}: {source}")
+
+    return output_dir / relative.with_name(relative.name[:-len(file_extension)] + ".html")
+
+
+def render_file(
+    paths: Tuple[Path, Path],
+    scripts: List[str],
+    encoding: str = "utf-8",
+    file_extension: str = ".mm.md",
+    transform: bool = False,
+    prerender: bool = False,
+    payload_encoding: str = "base64",
+) -> None:
+    """
+    Renders a mindmap into a standalone html file, resolving it like an include statement
+    """
+    source, target = paths
+    extension: MarkmapExtension = MarkmapExtension(
+        base_path=str(source.parent),
+        encoding=encoding,
+        file_extension=file_extension,
+        transform=transform,
+        prerender=prerender,
+        payload_encoding=payload_encoding,
+    )
+    body: str = Markdown(extensions=[extension]).convert(f"{{! {source.name} !}}")
+    html: str = HTML_TEMPLATE.format(
+        title=escape(source.name[:-len(file_extension)]),
+        style=(STATICS_PATH / "mkdocs-markmap.css").read_text(),
+        scripts="\n".join(scripts),
+        body=body,
+        script=(STATICS_PATH / "mkdocs-markmap.js").read_text(),
+    )
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(html, encoding="utf-8")
+
+
+def render_tree(
+    source_dir: Path,
+    output_dir: Optional[Path] = None,
+    encoding: str = "utf-8",
+    file_extension: str = ".mm.md",
+    transform: bool = False,
+    prerender: bool = False,
+    payload_encoding: str = "base64",
+    cache_dir: Optional[Path] = None,
+    offline: bool = False,
+    workers: Optional[int] = None,
+    force: bool = False,
+) -> int:
+    """
+    Renders all mindmaps of a directory tree, skipping outputs which are newer than their mindmap
+    """
+    sources: Iterable[Path] = [source_dir] if source_dir.is_file() else sorted(source_dir.rglob(f"*{file_extension}"))
+    base_dir: Path = source_dir.parent if source_dir.is_file() else source_dir
+    output_dir = output_dir or base_dir
+
+    jobs: List[Tuple[Path, Path]] = []
+    for source in sources:
+        target: Path = get_target(source, base_dir, output_dir, file_extension)
+        if not force and target.exists() and target.stat().st_mtime >= source.stat().st_mtime:
+            log.debug(f"mindmap up to date: {source}")
+            continue
+        jobs.append((source, target))
+
+    if not jobs:
+        log.info("all mindmaps up to date")
+        return 0
+
+    scripts: List[str] = load_scripts(transform, cache_dir or get_cache_dir(), offline=offline)
+    render = partial(
+        render_file,
+        scripts=scripts,
+        encoding=encoding,
+        file_extension=file_extension,
+        transform=transform,
+        prerender=prerender,
+        payload_encoding=payload_encoding,
+    )
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(render, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        for job in jobs:
+            render(job)
+
+    for source, target in jobs:
+        log.info(f"mindmap rendered: {target}")
+
+    return len(jobs)
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser: ArgumentParser = ArgumentParser(prog="python -m mkdocs_markmap", description="markmap tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    render: ArgumentParser = commands.add_parser("render", help="render mindmaps into standalone html files")
+    render.add_argument("source", type=Path, help="mindmap file or directory containing mindmaps")
+    render.add_argument("-o", "--output", type=Path, help="output directory (default: next to the mindmaps)")
+    render.add_argument("--encoding", default="utf-8", help="encoding of the mindmaps")
+    render.add_argument("--file-extension", default=".mm.md", help="file extension of the mindmaps")
+    render.add_argument("--transform", action="store_true", help="transform mindmaps into node trees")
+    render.add_argument("--prerender", action="store_true", help="embed a static svg of each mindmap")
+    render.add_argument("--payload-encoding", choices=PAYLOAD_ENCODINGS, default="base64")
+    render.add_argument("--cache-dir", type=Path, help="cache directory of the markmap libraries")
+    render.add_argument("--offline", action="store_true", help="use cached libraries only")
+    render.add_argument("-j", "--workers", type=int, help="number of processes (default: number of cores)")
+    render.add_argument("-f", "--force", action="store_true", help="render mindmaps, which are up to date")
+    clear_cache: ArgumentParser = commands.add_parser("clear-cache", help="clear the page cache of the plugin")
+    clear_cache.add_argument("--page-cache-dir", type=Path, default=Path(PAGE_CACHE_DIR), help="page cache directory")
+    options: Namespace = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)-7s -  %(message)s")
+    if options.command == "clear-cache":
+        PageCache(options.page_cache_dir).clear()
+        return
+
+    try:
+        render_tree(
+            options.source,
+            output_dir=options.output,
+            encoding=options.encoding,
+            file_extension=options.file_extension,
+            transform=options.transform,
+            prerender=options.prerender,
+            payload_encoding=options.payload_encoding,
+            cache_dir=options.cache_dir,
+            offline=options.offline,
+            workers=options.workers,
+            force=options.force,
+        )
+
+    except ValueError as e:
+        parser.error(str(e))
@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from pathlib import Path
+import re
+from typing import Dict, Iterable, List, Optional
+
+import attr
+
+from .extension import INCLUDE_CACHE, CachedInclude
+
+
+log = logging.getLogger("mkdocs.markmap")
+
+
+INCLUDE_BYTES_SYNTAX = re.compile(rb"\{!\s*(?P<path>.+?)\s*!\}")
+
+
+@attr.attrs
+class SourceScan(object):
+    includes: List[Path] = attr.attrib(factory=list)
+
+
+def scan_source(path: Path, base_path: Path, file_extension: str) -> SourceScan:
+    """
+    Detects the include statements of a markdown file without decoding it
+
+    Markmap fences are not detected, since they may be added by other extensions (e.g. snippets) while rendering.
+    """
+    content: bytes = path.read_bytes()
+    if b"{!" not in content:
+        return SourceScan()
+
+    includes: List[Path] = []
+    for match in INCLUDE_BYTES_SYNTAX.finditer(content):
+        include: Path = Path(match.group("path").decode(errors="replace"))
+        if not include.name.lower().endswith(file_extension):
+            continue
+        includes.append(include if include.is_absolute() else (base_path / include).resolve())
+
+    return SourceScan(includes=includes)
+
+
+def _scan_or_none(path: Path, base_path: Path, file_extension: str) -> Optional[SourceScan]:
+    try:
+        return scan_source(path, base_path, file_extension)
+    except OSError as e:
+        log.debug(f"unable to scan source: {path} ({e})")
+        return None
+
+
+def _prefetch_include(path: Path, encoding: str, payload_encoding: Optional[str]) -> bool:
+    try:
+        include: CachedInclude = INCLUDE_CACHE.get(path, encoding)
+        if payload_encoding is not None:
+            include.payload(payload_encoding)
+        return True
+    except Exception as e:
+        # reported by MarkmapPreprocessor, once the page is rendered
+        log.debug(f"unable to prefetch include: {path} ({e})")
+        return False
+
+
+def scan_sources(
+    sources: Dict[str, Path],
+    base_path: Path,
+    file_extension: str,
+    encoding: str,
+    payload_encoding: Optional[str] = "base64",
+    workers: Optional[int] = None,
+) -> Dict[str, SourceScan]:
+    """
+    Scans all sources concurrently and reads and encodes their includes into INCLUDE_CACHE
+    """
+    index: Dict[str, SourceScan] = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        scans: Iterable[Optional[SourceScan]] = executor.map(
+            lambda path: _scan_or_none(path, base_path, file_extension), sources.values()
+        )
+        for src_path, scan in zip(sources, scans):
+            if scan is not None:
+                index[src_path] = scan
+
+        includes: List[Path] = list(dict.fromkeys(include for scan in index.values() for include in scan.includes))
+        prefetched: int = sum(executor.map(lambda path: _prefetch_include(path, encoding, payload_encoding), includes))
+
+    log.debug(f"sources scanned: {len(index)}, pages including mindmaps: {sum(bool(scan.includes) for scan in index.values())}, "
+              f"includes prefetched: {prefetched}")
+
+    return index
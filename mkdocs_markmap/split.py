@@ -0,0 +1,45 @@
+from typing import Any, Callable, Dict, List
+
+
+Node = Dict[str, Any]
+
+
+def chunk_placeholder() -> Node:
+    """
+    Provides the child of a chunked node, since markmap-view allows expanding nodes with children only
+    """
+    return {"content": "…", "children": [], "payload": {"placeholder": 1}}
+
+
+def count_nodes(node: Node) -> int:
+    count: int = 0
+    stack: List[Node] = [node]
+    while stack:
+        current: Node = stack.pop()
+        count += 1
+        stack.extend(current.get("children") or ())
+
+    return count
+
+
+def split_tree(root: Node, depth: int, write_chunk: Callable[[List[Node]], str]) -> Node:
+    """
+    Keeps the top levels of a node tree, deeper subtrees are folded and replaced by references to chunks
+
+    Chunks are split recursively, so that each of them holds at most the given number of levels as well.
+    """
+    def visit(node: Node, level: int) -> Node:
+        children: List[Node] = node.get("children") or []
+        if not children:
+            return node
+
+        if level < depth:
+            node["children"] = [visit(child, level + 1) for child in children]
+            return node
+
+        chunk: List[Node] = [visit(child, 1) for child in children]
+        node["children"] = [chunk_placeholder()]
+        node.setdefault("payload", {}).update(fold=1, chunk=write_chunk(chunk))
+        return node
+
+    return visit(root, 1)
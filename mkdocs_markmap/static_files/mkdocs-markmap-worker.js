@@ -0,0 +1,42 @@
+// decodes and transforms markmaps off the main thread, see mkdocs-markmap.js
+self.window = self; // markmap-lib's browser bundle expects a window
+let transformer = null;
+
+function decodeBytes(encoded) {
+    const binary = atob(encoded);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < bytes.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    return bytes;
+}
+
+function decodePayload(payload, encoding) {
+    if (encoding === "json") return Promise.resolve(JSON.parse(payload));
+    if (encoding === "deflate") {
+        const stream = new Blob([decodeBytes(payload)]).stream().pipeThrough(new DecompressionStream("deflate"));
+        return new Response(stream).text();
+    }
+    if (encoding === "base64") return Promise.resolve(new TextDecoder().decode(decodeBytes(payload)));
+    return Promise.resolve(payload);
+}
+
+self.onmessage = async (event) => {
+    const { id, payload, encoding, format, lib } = event.data;
+    try {
+        const content = await decodePayload(payload, encoding);
+        let result;
+        if (format === "tree") {
+            result = typeof content === "string" ? JSON.parse(content) : content;
+        } else {
+            if (!transformer) {
+                importScripts(lib);
+                transformer = new self.markmap.Transformer();
+            }
+            result = transformer.transform(content);
+        }
+        self.postMessage({ id, root: result.root, frontmatter: result.frontmatter });
+    } catch (error) {
+        self.postMessage({ id, error: String(error) });
+    }
+};
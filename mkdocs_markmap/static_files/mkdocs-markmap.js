@@ -1,16 +1,66 @@
 (function initializeMarkmap() {
-    const transformer = new markmap.Transformer();
-    const preloadScripts = transformer.plugins
-        .flatMap((plugin) => plugin.config?.preloadScripts || [])
-        .map((item) => transformer.resolveJS(item));
-    const assets = transformer.getAssets();
-    const loading = Promise.all([
-        assets.styles && markmap.loadCSS(assets.styles),
-        markmap.loadJS([...preloadScripts, ...assets.scripts]),
-    ]);
-
-    function parseData(content) {
-        const { root, frontmatter } = transformer.transform(content);
+    const settings = document.currentScript?.dataset || {};
+    const scripts = (settings.scripts || "")
+        .split(" ")
+        .filter(Boolean)
+        .map((src) => new URL(src, document.baseURI).href);
+    let transformer = null;
+    let loading = null;
+
+    function loadScript(src) {
+        return new Promise((resolve, reject) => {
+            const script = document.createElement("script");
+            script.src = src;
+            script.onload = resolve;
+            script.onerror = reject;
+            document.head.appendChild(script);
+        });
+    }
+
+    function loadLibraries() {
+        if (settings.scriptLoading === "lazy") {
+            // preserve the order of d3, markmap-lib and markmap-view
+            return scripts.reduce((previous, src) => previous.then(() => loadScript(src)), Promise.resolve());
+        }
+        if (settings.scriptLoading === "defer" && document.readyState === "loading") {
+            // deferred scripts are executed right before DOMContentLoaded
+            return new Promise((resolve) => document.addEventListener("DOMContentLoaded", resolve, { once: true }));
+        }
+        return Promise.resolve();
+    }
+
+    function initializeLibraries() {
+        // markmap-lib is not loaded, if all markmaps were transformed at build time
+        transformer = markmap.Transformer ? new markmap.Transformer() : null;
+        if (!transformer) return;
+        const preloadScripts = transformer.plugins
+            .flatMap((plugin) => plugin.config?.preloadScripts || [])
+            .map((item) => transformer.resolveJS(item));
+        const assets = transformer.getAssets();
+        return Promise.all([
+            assets.styles && markmap.loadCSS(assets.styles),
+            markmap.loadJS([...preloadScripts, ...assets.scripts]),
+        ]);
+    }
+
+    function ensureLibraries() {
+        if (!loading) {
+            loading = loadLibraries().then(initializeLibraries);
+        }
+        return loading;
+    }
+
+    function parseData(content, format) {
+        const { root, frontmatter } =
+            format !== "tree"
+                ? transformer.transform(content)
+                : typeof content === "string"
+                    ? JSON.parse(content)
+                    : content;
+        return deriveData(root, frontmatter);
+    }
+
+    function deriveData(root, frontmatter) {
         let options = markmap.deriveOptions(frontmatter?.markmap);
         options = Object.assign(
             {
@@ -29,39 +79,245 @@
         m.fit();
     }
 
-    function decodeBase64(encoded) {
+    function decodeBytes(encoded) {
         const binary = atob(encoded);
         const bytes = new Uint8Array(binary.length);
         for (let i = 0; i < bytes.length; i++) {
             bytes[i] = binary.charCodeAt(i);
         }
-        return new TextDecoder().decode(bytes);
+        return bytes;
+    }
+
+    function decodePayload(payload, encoding) {
+        if (encoding === "json") return Promise.resolve(JSON.parse(payload));
+        if (encoding === "deflate") {
+            const stream = new Blob([decodeBytes(payload)]).stream().pipeThrough(new DecompressionStream("deflate"));
+            return new Response(stream).text();
+        }
+        if (encoding === "base64") return Promise.resolve(new TextDecoder().decode(decodeBytes(payload)));
+        return Promise.resolve(payload);
+    }
+
+    // promises of parsed markmaps by payload hash, surviving instant navigation between pages
+    const parsedCache = new Map();
+    const PARSED_CACHE_SIZE = 32;
+
+    function hashPayload(payload) {
+        // FNV-1a
+        let hash = 0x811c9dc5;
+        for (let i = 0; i < payload.length; i++) {
+            hash ^= payload.charCodeAt(i);
+            hash = Math.imul(hash, 0x01000193);
+        }
+        return `${payload.length}:${hash >>> 0}`;
+    }
+
+    function parseInline(payload, encoding, format) {
+        return decodePayload(payload, encoding).then((content) => parseData(content, format));
+    }
+
+    // optional worker decoding and transforming markmaps off the main thread
+    const workerUrl = settings.worker && new URL(settings.worker, document.baseURI).href;
+    const workerLib = settings.workerLib && new URL(settings.workerLib, document.baseURI).href;
+    const workerRequests = new Map();
+    let worker = null;
+    let workerRequestId = 0;
+    if (workerUrl && window.Worker) {
+        try {
+            worker = new Worker(workerUrl);
+            worker.onmessage = (event) => {
+                const { id, root, frontmatter, error } = event.data;
+                const request = workerRequests.get(id);
+                workerRequests.delete(id);
+                if (error) {
+                    request.reject(error);
+                } else {
+                    request.resolve(deriveData(root, frontmatter));
+                }
+            };
+            worker.onerror = () => {
+                // fall back to the main thread for all pending and future markmaps
+                worker = null;
+                for (const request of workerRequests.values()) {
+                    request.reject("worker failed");
+                }
+                workerRequests.clear();
+            };
+        } catch (error) {
+            worker = null;
+        }
+    }
+
+    function parseInWorker(payload, encoding, format) {
+        if (!worker) return parseInline(payload, encoding, format);
+        const id = ++workerRequestId;
+        return new Promise((resolve, reject) => {
+            workerRequests.set(id, { resolve, reject });
+            worker.postMessage({ id, payload, encoding, format, lib: workerLib });
+        }).catch(() => parseInline(payload, encoding, format));
+    }
+
+    function fetchData(src, format) {
+        return fetch(src)
+            .then((response) => {
+                if (!response.ok) throw new Error(`unable to fetch markmap: ${src}`);
+                return response.json();
+            })
+            .then((content) => parseData(content, format));
+    }
+
+    function getParsedData(dataEl) {
+        // externalized markmaps are content-addressed, so their url identifies them
+        const src = dataEl.dataset.src && new URL(dataEl.dataset.src, document.baseURI).href;
+        const payload = src ? "" : dataEl.textContent;
+        const encoding = dataEl.getAttribute("encoding");
+        const format = dataEl.getAttribute("format");
+        const key = src ? `src:${src}` : `${encoding}:${format}:${hashPayload(payload)}`;
+        let parsed = parsedCache.get(key);
+        if (parsed) {
+            parsedCache.delete(key);
+        } else {
+            parsed = src ? fetchData(src, format) : parseInWorker(payload, encoding, format);
+            // failed requests are retried by the next render
+            parsed.catch(() => parsedCache.delete(key));
+        }
+        parsedCache.set(key, parsed);
+        if (parsedCache.size > PARSED_CACHE_SIZE) {
+            parsedCache.delete(parsedCache.keys().next().value);
+        }
+        return parsed;
+    }
+
+    // parsed trees are shared by the cache, while markmap-view and loadChunks modify them (e.g. fold state)
+    const cloneTree = window.structuredClone
+        ? (root) => structuredClone(root)
+        : (root) => JSON.parse(JSON.stringify(root));
+
+    function loadChunks(m, root, base) {
+        // folded subtrees of split markmaps are fetched and replace their placeholder once expanded
+        const toggleNode = m.toggleNode.bind(m);
+        m.toggleNode = async (data, recursive) => {
+            const chunk = data.payload?.chunk;
+            if (!chunk) return toggleNode(data, recursive);
+            delete data.payload.chunk;
+            try {
+                const response = await fetch(new URL(chunk, base).href);
+                if (!response.ok) throw new Error(`unable to fetch markmap chunk: ${chunk}`);
+                data.children = await response.json();
+                data.payload.fold = 0;
+                await m.setData(root);
+            } catch (error) {
+                data.payload.chunk = chunk;
+                console.error(error);
+            }
+        };
+    }
+
+    function onInteraction(el, callback) {
+        const events = ["pointerenter", "focusin", "touchstart"];
+        const listener = () => {
+            events.forEach((name) => el.removeEventListener(name, listener));
+            callback();
+        };
+        events.forEach((name) => el.addEventListener(name, listener, { passive: true }));
     }
 
     function renderMarkmap(el) {
+        if (el.dataset.markmapState === "rendered") return;
         const dataEl = el.querySelector("markmap-data");
         if (!dataEl) return;
-        let content = el.textContent;
-        if (dataEl.getAttribute("encoding") === "base64") {
-            content = decodeBase64(content);
-        }
-        el.innerHTML = "<svg>";
-        svg = el.firstChild;
-        const { root, options } = parseData(content);
-        const m = markmap.Markmap.create(svg, options);
-        m.setData(root);
-        requestAnimationFrame(() => {
-            resetMarkmap(m, el);
-        });
+        el.dataset.markmapState = "rendered";
+        ensureLibraries()
+            .then(() => getParsedData(dataEl))
+            .then((parsed) => {
+                if (!el.isConnected) return;
+                const root = cloneTree(parsed.root);
+                const options = parsed.options;
+                el.innerHTML = "<svg>";
+                const svg = el.firstChild;
+                const m = markmap.Markmap.create(svg, options);
+                if (dataEl.dataset.chunks) {
+                    loadChunks(m, root, new URL(dataEl.dataset.chunks, document.baseURI));
+                }
+                m.setData(root);
+                requestAnimationFrame(() => {
+                    resetMarkmap(m, el);
+                });
+            })
+            .catch((error) => {
+                console.error(error);
+                // failed markmaps are rendered again on the next interaction
+                el.dataset.markmapState = "error";
+                onInteraction(el, () => renderMarkmap(el));
+            });
+    }
+
+    function hydrateMarkmap(el) {
+        // keep the size of the static svg until the interactive markmap is fitted
+        el.style.height = el.offsetHeight + "px";
+        renderMarkmap(el);
     }
 
+    const scheduleIdle = window.requestIdleCallback
+        ? (callback) => requestIdleCallback(callback, { timeout: 500 })
+        : (callback) => setTimeout(callback, 1);
+    const renderQueue = [];
+    let renderScheduled = false;
+
+    function flushRenderQueue(deadline) {
+        renderScheduled = false;
+        // render at least one markmap per idle period to make progress
+        do {
+            const el = renderQueue.shift();
+            if (el.isConnected) renderMarkmap(el);
+        } while (renderQueue.length && (!deadline || deadline.timeRemaining() > 1));
+        if (renderQueue.length) scheduleRender();
+    }
+
+    function scheduleRender() {
+        if (renderScheduled) return;
+        renderScheduled = true;
+        scheduleIdle(flushRenderQueue);
+    }
+
+    function enqueueMarkmap(el) {
+        renderQueue.push(el);
+        scheduleRender();
+    }
+
+    // markmaps are left as placeholders until they are about to scroll into view
+    const viewportObserver = window.IntersectionObserver
+        ? new IntersectionObserver(
+            (entries) => {
+                for (const entry of entries) {
+                    if (!entry.isIntersecting) continue;
+                    viewportObserver.unobserve(entry.target);
+                    enqueueMarkmap(entry.target);
+                }
+            },
+            { rootMargin: settings.rootMargin || "200px" }
+        )
+        : null;
+
     function updateMarkmaps(node) {
+        if (!node.querySelectorAll) return;
         for (const el of node.querySelectorAll(".mkdocs-markmap")) {
-            renderMarkmap(el);
+            // every markmap is scheduled only once, even if reported by several mutations
+            if (el.dataset.markmapState) continue;
+            el.dataset.markmapState = "pending";
+            if (el.querySelector(":scope > svg.markmap-static")) {
+                onInteraction(el, () => hydrateMarkmap(el));
+                continue;
+            }
+            if (viewportObserver) {
+                viewportObserver.observe(el);
+            } else {
+                enqueueMarkmap(el);
+            }
         }
     }
 
-    loading.then(() => {
+    function observeMarkmaps() {
         const observer = new MutationObserver((mutationList) => {
             for (const mutation of mutationList) {
                 if (mutation.type === "childList") {
@@ -75,5 +331,11 @@
         observer.observe(document.body, { childList: true });
 
         updateMarkmaps(document);
-    });
+    }
+
+    if (settings.scriptLoading === "lazy") {
+        observeMarkmaps();
+    } else {
+        ensureLibraries().then(observeMarkmaps);
+    }
 })();
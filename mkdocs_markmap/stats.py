@@ -0,0 +1,143 @@
+from contextlib import contextmanager, nullcontext
+from collections import defaultdict
+import json
+import logging
+from pathlib import Path
+from threading import Lock
+import time
+import tracemalloc
+from typing import TYPE_CHECKING, Any, ContextManager, Dict, Iterator, List, Optional
+
+import attr
+
+if TYPE_CHECKING:
+    from cProfile import Profile
+
+
+log = logging.getLogger("mkdocs.markmap")
+
+
+COUNTERS: List[str] = [
+    "pages_processed",
+    "pages_skipped",
+    "markmaps_found",
+    "includes_expanded",
+    "cache_hits",
+    "bytes_downloaded",
+]
+
+PROFILERS: List[str] = ["none", "cprofile", "tracemalloc"]
+
+# allocations of other packages are not reported by tracemalloc
+TRACEMALLOC_FILTER: str = str(Path(__file__).parent / "*")
+
+
+@attr.attrs
+class HookStats(object):
+    calls: int = attr.attrib(default=0)
+    seconds: float = attr.attrib(default=0.0)
+
+
+class BuildStats(object):
+    """
+    Optional instrumentation of plugin hooks and preprocessors, disabled unless started
+    """
+
+    def __init__(self):
+        self.enabled: bool = False
+        self.profiler: str = "none"
+        self.hooks: Dict[str, HookStats] = defaultdict(HookStats)
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self._profile: Optional["Profile"] = None
+        self._depth: int = 0
+        self._lock: Lock = Lock()
+
+    def start(self, profiler: str = "none") -> None:
+        self.enabled = True
+        self.profiler = profiler
+        self.hooks = defaultdict(HookStats)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self._profile = None
+        if profiler == "cprofile":
+            from cProfile import Profile
+
+            self._profile = Profile()
+        self._depth = 0
+        if profiler == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self) -> None:
+        self.enabled = False
+        if self.profiler == "tracemalloc" and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def count(self, name: str, value: int = 1) -> None:
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += value
+
+    def measure(self, name: str) -> ContextManager:
+        """
+        Accumulates the wall time of a block, which is profiled as well if a profiler is configured
+        """
+        if not self.enabled:
+            return nullcontext()
+
+        return self._measure(name)
+
+    @contextmanager
+    def _measure(self, name: str) -> Iterator[None]:
+        self._depth += 1
+        if self._profile is not None and self._depth == 1:
+            self._profile.enable()
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed: float = time.perf_counter() - start
+            if self._profile is not None and self._depth == 1:
+                self._profile.disable()
+            self._depth -= 1
+            with self._lock:
+                self.hooks[name].calls += 1
+                self.hooks[name].seconds += elapsed
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "hooks": {name: attr.asdict(hook) for name, hook in sorted(self.hooks.items())},
+            "counters": dict(self.counters),
+        }
+
+    def log_summary(self) -> None:
+        total: float = sum(hook.seconds for hook in self.hooks.values())
+        log.info(f"markmap stats: {total * 1000:.1f} ms in total")
+        for name, hook in sorted(self.hooks.items(), key=lambda item: -item[1].seconds):
+            log.info(f"  {name}: {hook.seconds * 1000:.1f} ms in {hook.calls} calls")
+        for name, value in self.counters.items():
+            log.info(f"  {name.replace('_', ' ')}: {value}")
+
+    def write_report(self, file_path: Path) -> None:
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(json.dumps(self.to_dict(), indent=2))
+        log.info(f"markmap stats written: {file_path}")
+
+    def dump_profile(self, file_path: Path) -> None:
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        if self._profile is not None:
+            self._profile.dump_stats(str(file_path))
+
+        elif self.profiler == "tracemalloc" and tracemalloc.is_tracing():
+            snapshot: tracemalloc.Snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(True, TRACEMALLOC_FILTER)]
+            )
+            statistics: List[tracemalloc.Statistic] = snapshot.statistics("lineno")
+            file_path.write_text("".join(f"{statistic}\n" for statistic in statistics))
+
+        else:
+            return
+
+        log.info(f"markmap profile written: {file_path}")
+
+
+# shared by plugin, preprocessors and downloads
+STATS: BuildStats = BuildStats()
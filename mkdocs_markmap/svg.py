@@ -0,0 +1,152 @@
+import json
+import re
+from functools import lru_cache
+from html import escape, unescape
+from typing import Any, Dict, Iterator, List
+
+from .transform import TRANSFORM_CACHE
+
+
+TAG_SYNTAX = re.compile(r"<[^>]+>")
+
+# d3.schemeCategory10, as used by markmap-view
+COLORS: List[str] = [
+    "#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd",
+    "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf",
+]
+
+FONT_SIZE: int = 16
+LINE_HEIGHT: int = 20
+PADDING_X: int = 8
+CIRCLE_RADIUS: int = 6
+MARGIN: int = 10
+SPACING_HORIZONTAL: int = 80
+SPACING_VERTICAL: int = 5
+MAX_WIDTH: int = 0
+
+
+def _text_width(text: str) -> float:
+    """
+    Approximates the rendered width of a text, wide characters count as full em
+    """
+    return sum(FONT_SIZE * (1.0 if ord(char) >= 0x2E80 else 0.6) for char in text)
+
+
+class LayoutNode(object):
+    def __init__(self, label: str, color: str, folded: bool, options: Dict[str, Any]):
+        self.label: str = label
+        self.color: str = color
+        self.folded: bool = folded
+        self.children: List["LayoutNode"] = []
+        self.width: float = _text_width(label) + 2 * PADDING_X
+        max_width: int = options.get("maxWidth", MAX_WIDTH)
+        if max_width:
+            self.width = min(self.width, max_width)
+        self.height: float = LINE_HEIGHT
+        self.x: float = 0
+        self.y: float = 0
+
+    def walk(self) -> Iterator["LayoutNode"]:
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+def _build(node: Dict[str, Any], depth: int, options: Dict[str, Any], counter: List[int]) -> LayoutNode:
+    label: str = unescape(TAG_SYNTAX.sub("", node.get("content", ""))).strip()
+    expand_level: int = options.get("initialExpandLevel", -1)
+    folded: bool = bool(node.get("payload", {}).get("fold")) or 0 <= expand_level <= depth
+    layout: LayoutNode = LayoutNode(label, COLORS[counter[0] % len(COLORS)], folded, options)
+    counter[0] += 1
+    if not folded:
+        layout.children = [_build(child, depth + 1, options, counter) for child in node.get("children", [])]
+    else:
+        layout.folded = bool(node.get("children"))
+
+    return layout
+
+
+def _layout(root: LayoutNode, options: Dict[str, Any]) -> None:
+    """
+    Tidy tree layout: leaves are stacked from top to bottom, parents are centered on their children
+    """
+    spacing_horizontal: int = options.get("spacingHorizontal", SPACING_HORIZONTAL)
+    spacing_vertical: int = options.get("spacingVertical", SPACING_VERTICAL)
+    next_y: List[float] = [0]
+
+    def place(node: LayoutNode, x: float) -> None:
+        node.x = x
+        for child in node.children:
+            place(child, x + node.width + spacing_horizontal)
+        if node.children:
+            node.y = (node.children[0].y + node.children[-1].y) / 2
+        else:
+            node.y = next_y[0]
+            next_y[0] += node.height + spacing_vertical
+
+    place(root, 0)
+
+
+def _render_svg(root: LayoutNode) -> str:
+    nodes: List[LayoutNode] = list(root.walk())
+    min_y: float = min(node.y for node in nodes) - MARGIN
+    max_y: float = max(node.y + node.height for node in nodes) + MARGIN
+    max_x: float = max(node.x + node.width for node in nodes) + CIRCLE_RADIUS + MARGIN
+    width: float = max_x + MARGIN
+    height: float = max_y - min_y
+
+    links: List[str] = []
+    labels: List[str] = []
+    for node in nodes:
+        bottom: float = node.y + node.height
+        for child in node.children:
+            source_x: float = node.x + node.width
+            target_x: float = child.x
+            middle_x: float = (source_x + target_x) / 2
+            child_bottom: float = child.y + child.height
+            links.append(
+                f'<path d="M{source_x:.1f},{bottom:.1f}C{middle_x:.1f},{bottom:.1f} '
+                f'{middle_x:.1f},{child_bottom:.1f} {target_x:.1f},{child_bottom:.1f}" stroke="{child.color}"/>'
+            )
+        labels.append(
+            f'<line x1="{node.x:.1f}" y1="{bottom:.1f}" x2="{node.x + node.width:.1f}" y2="{bottom:.1f}" '
+            f'stroke="{node.color}"/>'
+        )
+        if node.children or node.folded:
+            fill: str = node.color if node.folded else "#fff"
+            labels.append(
+                f'<circle cx="{node.x + node.width:.1f}" cy="{bottom:.1f}" r="{CIRCLE_RADIUS}" '
+                f'stroke="{node.color}" fill="{fill}"/>'
+            )
+        labels.append(f'<text x="{node.x + PADDING_X:.1f}" y="{bottom - 5:.1f}">{escape(node.label)}</text>')
+
+    return (
+        f'<svg class="markmap-static" xmlns="http://www.w3.org/2000/svg" '
+        f'viewBox="{-MARGIN} {min_y:.1f} {width:.1f} {height:.1f}" '
+        f'role="img" aria-label="{escape(root.label)}">'
+        f'<g fill="none" stroke-width="1.5">{"".join(links)}</g>'
+        f'<g stroke-width="1.5" font-family="sans-serif" font-size="{FONT_SIZE}">{"".join(labels)}</g>'
+        "</svg>"
+    )
+
+
+@lru_cache(maxsize=256)
+def prerender(markmap: str) -> str:
+    """
+    Provides a static svg of a markmap, approximating the layout of markmap-view
+    """
+    return prerender_tree(json.loads(TRANSFORM_CACHE.get(markmap)))
+
+
+def prerender_tree(data: Dict[str, Any]) -> str:
+    """
+    Provides a static svg of a transformed markmap (i.e. its root node and frontmatter)
+    """
+    options: Dict[str, Any] = (data.get("frontmatter") or {}).get("markmap") or {}
+    if not isinstance(options, dict):
+        options = {}
+
+    root: LayoutNode = _build(data["root"], 0, options, [0])
+    _layout(root, options)
+
+    return _render_svg(root)
@@ -0,0 +1,263 @@
+import hashlib
+import json
+import logging
+import re
+from collections import OrderedDict
+from html import escape, unescape
+from threading import Lock, local
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from markdown import Markdown
+
+from .stats import STATS
+
+
+log = logging.getLogger("mkdocs.markmap")
+
+
+FRONTMATTER_SYNTAX = re.compile(r"\A---[ \t]*\n(?P<yaml>.*?\n)?---[ \t]*(?:\n|\Z)", re.DOTALL)
+HEADING_SYNTAX = re.compile(r"^ {0,3}(?P<level>#{1,6})(?:[ \t]+(?P<text>.*?))?(?:[ \t]+#+)?[ \t]*$")
+LIST_ITEM_SYNTAX = re.compile(r"^(?P<indent>[ \t]*)(?P<marker>[-*+]|\d{1,9}[.)])(?:[ \t]+(?P<text>.*))?$")
+FENCE_SYNTAX = re.compile(r"^(?P<indent>[ \t]*)(?P<fence>`{3,}|~{3,})[ \t]*(?P<lang>[^`\s]*)")
+FOLD_SYNTAX = re.compile(r"\s*<!--\s*markmap:\s*fold\s*-->\s*")
+PARAGRAPH_SYNTAX = re.compile(r"\A<p>(?P<content>.*)</p>\Z", re.DOTALL)
+TAG_SYNTAX = re.compile(r"<[^>]+>")
+
+# list items are nested below all headings, deeper indentation means deeper nesting
+LIST_LEVEL: int = 10
+
+Node = Dict[str, Any]
+
+_local = local()
+
+
+def _render_inline(text: str) -> str:
+    md: Optional[Markdown] = getattr(_local, "md", None)
+    if md is None:
+        md = _local.md = Markdown()
+
+    html: str = md.reset().convert(text)
+    match: Optional[re.Match] = PARAGRAPH_SYNTAX.match(html)
+    if match is not None and "<p>" not in match.group("content"):
+        return match.group("content")
+
+    return html
+
+
+def _set_content(node: Node, text: str, prefix: str = "") -> Node:
+    if FOLD_SYNTAX.search(text):
+        text = FOLD_SYNTAX.sub(" ", text).strip()
+        node["payload"]["fold"] = 1
+
+    node["content"] = prefix + _render_inline(text)
+    return node
+
+
+def _create_node(text: str, tag: str, prefix: str = "") -> Node:
+    return _set_content({"content": "", "children": [], "payload": {"tag": tag}}, text, prefix)
+
+
+def _indent_width(indent: str) -> int:
+    return len(indent.replace("\t", "    "))
+
+
+class TreeBuilder(object):
+    """
+    Builds the markmap node tree from headings, list items, paragraphs and code blocks
+    """
+
+    def __init__(self):
+        self.root: Node = {"content": "", "children": []}
+        self.stack: List[Tuple[int, Node]] = [(0, self.root)]
+        self.paragraph: List[str] = []
+        self.item: Optional[Tuple[Node, List[str], str]] = None
+
+    def _flush_paragraph(self) -> None:
+        self.item = None
+        if self.paragraph:
+            self.stack[-1][1]["children"].append(_create_node("\n".join(self.paragraph), "p"))
+            self.paragraph = []
+
+    def _push(self, level: int, node: Node) -> None:
+        while self.stack[-1][0] >= level:
+            self.stack.pop()
+        self.stack[-1][1]["children"].append(node)
+        self.stack.append((level, node))
+
+    def _close_lists(self, indent: int) -> None:
+        # text below a list item belongs to it as long as it is indented accordingly
+        while self.stack[-1][0] >= LIST_LEVEL and self.stack[-1][0] > LIST_LEVEL + indent:
+            self.stack.pop()
+        if self.stack[-1][0] >= LIST_LEVEL and indent == 0:
+            self.stack.pop()
+
+    def build(self, lines: Iterable[str]) -> Node:
+        fence: Optional[Tuple[int, str, str]] = None
+        code: List[str] = []
+        for line in lines:
+            if fence is not None:
+                indent, marker, lang = fence
+                if line.strip().startswith(marker) and line.strip().strip(marker[0]) == "":
+                    css_class: str = f' class="language-{escape(lang)}"' if lang else ""
+                    html: str = f"<pre><code{css_class}>{escape(chr(10).join(code))}</code></pre>"
+                    self.stack[-1][1]["children"].append({"content": html, "children": [], "payload": {"tag": "pre"}})
+                    fence = None
+                    code = []
+                else:
+                    code.append(line[indent:] if line[:indent].strip() == "" else line.lstrip())
+                continue
+
+            if line.strip() == "":
+                self._flush_paragraph()
+                continue
+
+            match: Optional[re.Match] = FENCE_SYNTAX.match(line)
+            if match is not None:
+                self._flush_paragraph()
+                indent: int = _indent_width(match.group("indent"))
+                self._close_lists(indent)
+                fence = (len(match.group("indent")), match.group("fence"), match.group("lang"))
+                continue
+
+            match = HEADING_SYNTAX.match(line)
+            if match is not None:
+                self._flush_paragraph()
+                level: int = len(match.group("level"))
+                self._push(level, _create_node(match.group("text") or "", f"h{level}"))
+                continue
+
+            match = LIST_ITEM_SYNTAX.match(line)
+            if match is not None:
+                self._flush_paragraph()
+                text: str = match.group("text") or ""
+                prefix: str = f"{match.group('marker')[:-1]}. " if match.group("marker")[0].isdigit() else ""
+                node: Node = _create_node(text, "li", prefix)
+                self._push(LIST_LEVEL + 1 + _indent_width(match.group("indent")), node)
+                self.item = (node, [text], prefix)
+                continue
+
+            if self.item is not None:
+                # lazy continuation of a list item
+                node, texts, prefix = self.item
+                texts.append(line.strip())
+                _set_content(node, "\n".join(texts), prefix)
+                continue
+
+            indent = _indent_width(line[:len(line) - len(line.lstrip())])
+            if not self.paragraph:
+                self._close_lists(indent)
+            self.paragraph.append(line.strip())
+
+        self._flush_paragraph()
+        return self.root
+
+
+def transform(content: str) -> Dict[str, Any]:
+    """
+    Transforms markdown into a markmap node tree, similar to markmap.Transformer
+    """
+    frontmatter: Dict[str, Any] = {}
+    match: Optional[re.Match] = FRONTMATTER_SYNTAX.match(content)
+    if match is not None:
+        import yaml
+
+        try:
+            frontmatter = yaml.safe_load(match.group("yaml") or "") or {}
+        except yaml.YAMLError as e:
+            log.warning(f"unable to parse markmap frontmatter: {e}")
+        content = content[match.end():]
+
+    root: Node = TreeBuilder().build(content.splitlines())
+    if len(root["children"]) == 1:
+        root = root["children"][0]
+
+    result: Dict[str, Any] = {"root": root}
+    if isinstance(frontmatter, dict) and frontmatter.get("markmap"):
+        result["frontmatter"] = {"markmap": frontmatter["markmap"]}
+
+    return result
+
+
+def outline(root: Node) -> List[str]:
+    """
+    Provides the distinct plain text labels of a node tree in document order
+    """
+    labels: Dict[str, None] = {}
+    stack: List[Node] = [root]
+    while stack:
+        node: Node = stack.pop()
+        label: str = unescape(TAG_SYNTAX.sub("", node.get("content", ""))).strip()
+        if label:
+            labels.setdefault(label)
+        stack.extend(reversed(node.get("children") or ()))
+
+    return list(labels)
+
+
+def transform_json(content: str) -> str:
+    return json.dumps(transform(content), separators=(",", ":"), ensure_ascii=False)
+
+
+class TransformCache(object):
+    """
+    Bounded LRU cache of transformed markmaps keyed by content hash
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize: int = maxsize
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock: Lock = Lock()
+
+    @staticmethod
+    def key(content: str) -> str:
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def _store(self, key: str, tree: str) -> None:
+        with self._lock:
+            self._entries[key] = tree
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, content: str) -> str:
+        """
+        Provides the node tree of a markmap as json
+        """
+        key: str = self.key(content)
+        with self._lock:
+            tree: Optional[str] = self._entries.get(key)
+            if tree is not None:
+                self._entries.move_to_end(key)
+                STATS.count("cache_hits")
+                return tree
+
+        tree = transform_json(content)
+        self._store(key, tree)
+
+        return tree
+
+    def prepare(self, contents: Iterable[str], workers: int = 1) -> None:
+        """
+        Transforms all contents ahead of rendering, using a process pool if more than one worker is requested
+        """
+        pending: Dict[str, str] = {}
+        for content in contents:
+            key: str = self.key(content)
+            if key not in self._entries:
+                pending[key] = content
+
+        if workers <= 1 or len(pending) <= 1:
+            for content in pending.values():
+                self.get(content)
+            return
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for key, tree in zip(pending, executor.map(transform_json, pending.values(), chunksize=8)):
+                self._store(key, tree)
+
+        log.debug(f"markmaps transformed in {workers} processes: {len(pending)}")
+
+
+TRANSFORM_CACHE: TransformCache = TransformCache()
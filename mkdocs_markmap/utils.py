@@ -1,43 +1,241 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import suppress
+import gzip
+import hashlib
+import json
 import logging
 import os
 from pathlib import Path
-from urllib.parse import unquote
+import re
+import tempfile
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import SplitResult, unquote, urlsplit
 
-from requests import Response
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
-from requests.packages.urllib3.util.url import Url, parse_url
-from requests.sessions import Session
+from .stats import STATS
+
+# requests and bs4 are imported once needed, most builds neither download scripts nor parse html
+if TYPE_CHECKING:
+    from requests import Response
+    from requests.sessions import Session
 
 
 log = logging.getLogger("mkdocs.markmap")
 
 
-def download(base_path: Path, url: str, flat: bool = False, force_reload: bool = False, extname: str = "") -> str:
-    parsed_url: Url = parse_url(url)
-    path: str = unquote(parsed_url.request_uri.split("?")[0])
-    sub_path: str = os.path.basename(path) if flat else f"{parsed_url.hostname}{path}"
-    if extname and not sub_path.endswith(extname):
-        sub_path += extname
-    file_path: Path = base_path / sub_path
+CACHE_DIR_NAME: str = "mkdocs-markmap"
 
-    if file_path.exists():
-        return str(sub_path)
+# searched in the original document, lowering it may change the length of non-ascii text
+HEAD_END_SYNTAX = re.compile(r"</head\s*>", re.IGNORECASE)
+BODY_END_SYNTAX = re.compile(r"</body\s*>", re.IGNORECASE)
+
+
+_session: Optional["Session"] = None
+
+# urls revalidated by this process, mkdocs serve does not need to revalidate them on every rebuild
+_revalidated: Dict[str, str] = {}
+
+
+def get_session() -> "Session":
+    """
+    Provides a connection-pooled session shared by all downloads
+    """
+    global _session
+    if _session is None:
+        from requests.adapters import HTTPAdapter
+        from requests.packages.urllib3.util.retry import Retry
+        from requests.sessions import Session
 
-    file_path.parent.mkdir(parents=True, exist_ok=True)
-    if force_reload or not file_path.exists():
         retries: Retry = Retry(connect=5, read=2, redirect=5)
         adapter: HTTPAdapter = HTTPAdapter(max_retries=retries)
         http: Session = Session()
         http.mount("https://", adapter)
         http.mount("http://", adapter)
+        _session = http
+
+    return _session
+
 
-        response: Response = http.get(url, allow_redirects=True, timeout=3.0)
-        with open(file_path, "wb") as fp:
-            for chunk in response.iter_content(chunk_size=1024): 
+def get_cache_dir() -> Path:
+    """
+    Provides the default user-level cache directory (XDG-style)
+    """
+    base_path: str = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(base_path) / CACHE_DIR_NAME
+
+
+def _hash_file(file_path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(65536), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _write_atomic(file_path: Path, chunks: Iterable[bytes]) -> str:
+    """
+    Writes chunks to a temporary file and renames it into place, providing the sha256 of the content
+    """
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            for chunk in chunks:
                 if chunk:
+                    digest.update(chunk)
                     fp.write(chunk)
+        # mkstemp creates private files, published files need to be readable
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, file_path)
+
+    except BaseException:
+        with suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+
+    return digest.hexdigest()
+
+
+def fetch_cached(url: str, cache_dir: Path, offline: bool = False) -> Tuple[Path, str]:
+    """
+    Provides path and sha256 of a cached url, revalidating it unless offline
+    """
+    key: str = hashlib.sha256(url.encode()).hexdigest()
+    content_path: Path = cache_dir / key
+    meta_path: Path = cache_dir / f"{key}.json"
+
+    meta: Dict[str, Optional[str]] = {}
+    with suppress(OSError, ValueError):
+        meta = json.loads(meta_path.read_text())
+    valid: bool = bool(meta) and content_path.exists() and _hash_file(content_path) == meta.get("sha256")
+
+    if offline or (valid and _revalidated.get(url) == meta["sha256"]):
+        if not valid:
+            raise FileNotFoundError(f"script not cached, unable to download in offline mode: {url}")
+        STATS.count("cache_hits")
+        return content_path, meta["sha256"]
 
+    headers: Dict[str, str] = {}
+    if valid and meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if valid and meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        response: "Response" = get_session().get(url, headers=headers, allow_redirects=True, timeout=3.0, stream=True)
+        if valid and response.status_code == 304:
+            log.debug(f"script not modified: {url}")
+            STATS.count("cache_hits")
+            _revalidated[url] = meta["sha256"]
+            return content_path, meta["sha256"]
+
+        response.raise_for_status()
+        sha256: str = _write_atomic(content_path, response.iter_content(chunk_size=1024))
+        STATS.count("bytes_downloaded", content_path.stat().st_size)
+
+    except Exception as e:
+        if not valid:
+            raise
+        log.warning(f"unable to revalidate script, using cached version: {url} ({e})")
+        return content_path, meta["sha256"]
+
+    meta = {
+        "url": url,
+        "sha256": sha256,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    _write_atomic(meta_path, [json.dumps(meta).encode()])
+    _revalidated[url] = sha256
     log.info(f"script downloaded: {url}")
 
-    return str(sub_path)
+    return content_path, sha256
+
+
+def get_sub_path(url: str, flat: bool = False, extname: str = "") -> str:
+    parsed_url: SplitResult = urlsplit(url)
+    path: str = unquote(parsed_url.path or "/")
+    sub_path: str = os.path.basename(path) if flat else f"{parsed_url.hostname}{path}"
+    if extname and not sub_path.endswith(extname):
+        sub_path += extname
+
+    return sub_path
+
+
+def install_cached(cached_path: Path, sha256: str, file_path: Path, force_reload: bool = False) -> None:
+    """
+    Copies a cached file into place, unless it is already up to date
+    """
+    if force_reload or not file_path.exists() or _hash_file(file_path) != sha256:
+        with open(cached_path, "rb") as fp:
+            _write_atomic(file_path, iter(lambda: fp.read(65536), b""))
+
+
+def write_compressed(file_path: Path, content: bytes) -> None:
+    """
+    Writes content along with precompressed .gz and .br (if brotli is installed) sidecars
+    """
+    _write_atomic(file_path, [content])
+    _write_atomic(file_path.with_name(file_path.name + ".gz"), [gzip.compress(content, compresslevel=9, mtime=0)])
+    try:
+        import brotli
+    except ImportError:
+        log.debug("brotli is not installed, skipping .br file")
+        return
+
+    _write_atomic(file_path.with_name(file_path.name + ".br"), [brotli.compress(content)])
+
+
+def fetch_all(urls: Iterable[str], cache_dir: Path, offline: bool = False) -> Dict[str, Optional[Tuple[Path, str]]]:
+    """
+    Fetches all urls into the cache concurrently, providing path and sha256 of each url (None if fetching failed)
+    """
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+
+    cached: Dict[str, Optional[Tuple[Path, str]]] = {}
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        futures: Dict[str, Future] = {
+            url: executor.submit(fetch_cached, url, cache_dir, offline=offline)
+            for url in urls
+        }
+        for url, future in futures.items():
+            try:
+                cached[url] = future.result()
+            except Exception as e:
+                log.error(f"unable to download script: {url}")
+                log.debug(f"download error: {e}")
+                cached[url] = None
+
+    return cached
+
+
+def inject_tags(html: str, head: Iterable[str] = (), body: Iterable[str] = ()) -> str:
+    """
+    Appends tags to head and body, leaving the remaining document untouched
+    """
+    head_markup: str = "".join(head)
+    body_markup: str = "".join(body)
+    head_match: Optional[re.Match] = HEAD_END_SYNTAX.search(html)
+    body_matches: List[re.Match] = list(BODY_END_SYNTAX.finditer(html))
+    head_end: int = head_match.start() if head_match else -1
+    body_end: int = body_matches[-1].start() if body_matches else -1
+    if 0 <= head_end < body_end:
+        return "".join((
+            html[:head_end],
+            head_markup,
+            html[head_end:body_end],
+            body_markup,
+            html[body_end:],
+        ))
+
+    log.debug("head or body not closed, falling back to html parser")
+    from bs4 import BeautifulSoup
+
+    soup: BeautifulSoup = BeautifulSoup(html, "html.parser")
+    for tag_name, markup in (("head", head_markup), ("body", body_markup)):
+        (getattr(soup, tag_name) or soup).append(BeautifulSoup(markup, "html.parser"))
+
+    return str(soup)
@@ -57,6 +57,9 @@ setup(
         ],
         'markdown.extensions': [
             'markmap = mkdocs_markmap.extension:MarkmapExtension',
-        ]
+        ],
+        'console_scripts': [
+            'mkdocs-markmap = mkdocs_markmap.render:main',
+        ],
     },
 )
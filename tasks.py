@@ -77,3 +77,29 @@ def distribute(c, tag=TARGET_TAG, dry_run=True):
 
     handler: DistributionHandler = DistributionHandler(tag)
     handler.distribute(dry_run=dry_run)
+
+
+@task
+def benchmark(
+    c, pages=100, markmap_fraction=0.5, markmaps_per_page=2, include_fanout=1, nodes=50, repeat=5,
+    output=None, baseline=None,
+):
+    # builds sites with the plugin, which release tasks do not need to import
+    from mkdocs_markmap_build.benchmark import Benchmark, SiteGenerator, compare, save
+
+    print(f'run benchmark: {PROJECT_VERSION}')
+
+    generator: SiteGenerator = SiteGenerator(
+        pages=int(pages),
+        markmap_fraction=float(markmap_fraction),
+        markmaps_per_page=int(markmaps_per_page),
+        include_fanout=int(include_fanout),
+        nodes=int(nodes),
+    )
+    results = Benchmark(generator, repeat=int(repeat)).run()
+
+    if output is not None:
+        save(results, output)
+
+    if baseline is not None and not compare(results, baseline):
+        sys.exit(1)
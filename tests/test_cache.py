@@ -0,0 +1,60 @@
+import os
+from pathlib import Path
+
+from mkdocs_markmap.cache import ENTRIES_DIR, PageCache
+
+
+def test_page_cache_hit(tmp_path: Path):
+    cache: PageCache = PageCache(tmp_path)
+    key: str = PageCache.key("post_page", "index.html", "<markmap-data>")
+
+    assert cache.get(key) is None
+    cache.set(key, {"elements": ["<markmap-data>"]})
+
+    assert PageCache(tmp_path).get(key) == {"elements": ["<markmap-data>"]}
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_page_cache_invalidation(tmp_path: Path):
+    cache: PageCache = PageCache(tmp_path)
+    cache.set(PageCache.key("post_page", "index.html", "# map"), {"elements": []})
+
+    # changed content (or config) changes the key
+    assert cache.get(PageCache.key("post_page", "index.html", "# changed map")) is None
+    assert PageCache.key("a", "bc") != PageCache.key("ab", "c")
+
+
+def test_page_cache_blobs(tmp_path: Path):
+    cache: PageCache = PageCache(tmp_path / "cache")
+    data_path: Path = tmp_path / "data.json"
+    data_path.write_bytes(b"{}")
+
+    cache.store_blob("data.json", data_path)
+
+    assert cache.load_blob("data.json") == b"{}"
+    assert cache.load_blob("missing.json") is None
+
+
+def test_page_cache_prune(tmp_path: Path):
+    cache: PageCache = PageCache(tmp_path)
+    keys = [PageCache.key(str(index)) for index in range(3)]
+    for index, key in enumerate(keys):
+        cache.set(key, {"elements": ["x" * 100]})
+        entry_path: Path = tmp_path / ENTRIES_DIR / key[:2] / f"{key}.json"
+        os.utime(entry_path, (1000 + index, 1000 + index))
+    cache.max_size = entry_path.stat().st_size * 2
+
+    cache.prune()
+
+    # least recently used entries are evicted first
+    assert [cache.get(key) is not None for key in keys] == [False, True, True]
+
+
+def test_page_cache_clear(tmp_path: Path):
+    cache: PageCache = PageCache(tmp_path / "cache")
+    key: str = PageCache.key("page")
+    cache.set(key, {})
+
+    cache.clear()
+
+    assert cache.get(key) is None
@@ -0,0 +1,109 @@
+import json
+from pathlib import Path
+import re
+from typing import List
+
+from markdown import Markdown
+import pytest
+
+from mkdocs_markmap import extension
+from mkdocs_markmap.extension import MARKMAP_CLASS, PAYLOAD_ENCODINGS, MarkmapExtension, decode_markmap, encode_markmap
+
+
+def convert(text: str) -> str:
+    return Markdown(extensions=["fenced_code", MarkmapExtension()]).convert(text)
+
+
+def test_markmap_fence():
+    html: str = convert("```markmap\n# markmap\n```\n")
+
+    assert html == (
+        f'<div class="{MARKMAP_CLASS}"><markmap-data encoding="base64" hidden="true">'
+        f'{encode_markmap("# markmap")}</markmap-data></div>'
+    )
+
+
+def test_markmap_fence_nested_into_other_fence():
+    html: str = convert("````markdown\n```markmap\n# example\n```\n````\n\n~~~markmap\n# markmap\n~~~\n")
+
+    assert html.startswith('<pre><code class="language-markdown">```markmap\n# example\n```\n</code></pre>')
+    assert html.count(MARKMAP_CLASS) == 1
+    assert encode_markmap("# markmap") in html
+    assert encode_markmap("# example") not in html
+
+
+def test_markmap_fence_unclosed():
+    html: str = convert("```markmap\n# markmap\n")
+
+    assert MARKMAP_CLASS not in html
+
+
+class CountingSyntax(object):
+    def __init__(self, syntax: re.Pattern):
+        self.syntax = syntax
+        self.searches: int = 0
+
+    def search(self, *args):
+        self.searches += 1
+        return self.syntax.search(*args)
+
+
+def count_include_searches(monkeypatch, tmp_path: Path, lines: List[str]) -> int:
+    md: Markdown = Markdown(extensions=[MarkmapExtension(base_path=str(tmp_path))])
+    syntax: CountingSyntax = CountingSyntax(extension.INCLUDE_SYNTAX)
+    monkeypatch.setattr(extension, "INCLUDE_SYNTAX", syntax)
+    md.preprocessors["include_markmap"].run(lines)
+    monkeypatch.undo()
+
+    return syntax.searches
+
+
+@pytest.mark.parametrize("per_line", [1, 10])
+def test_include_expansion_is_linear(monkeypatch, tmp_path: Path, per_line: int):
+    for index in range(400):
+        (tmp_path / f"map{index}.mm.md").write_text(f"# map {index}\n")
+
+    def page(includes: int) -> List[str]:
+        statements: List[str] = [f"text {{! map{index}.mm.md !}}" for index in range(includes)]
+        return [" ".join(statements[start:start + per_line]) for start in range(0, includes, per_line)]
+
+    # each include statement is searched once, regardless of the number of statements before it
+    small: int = count_include_searches(monkeypatch, tmp_path, page(100))
+    large: int = count_include_searches(monkeypatch, tmp_path, page(400))
+    assert small == 100
+    assert large == 4 * small
+
+
+def test_include_skipped_for_scanned_pages(tmp_path: Path):
+    (tmp_path / "map.mm.md").write_text("# map\n")
+    md: Markdown = Markdown(extensions=[MarkmapExtension(base_path=str(tmp_path), skip_includes=lambda: True)])
+
+    assert MARKMAP_CLASS not in md.convert("{! map.mm.md !}")
+
+
+def test_extension_config_not_shared():
+    first: MarkmapExtension = MarkmapExtension(base_path="first", skip_includes=lambda: True)
+    second: MarkmapExtension = MarkmapExtension()
+
+    assert first.getConfig("base_path") == "first"
+    assert second.getConfig("base_path") == "docs"
+    assert second.getConfig("skip_includes")() is False
+
+
+@pytest.mark.parametrize("encoding", PAYLOAD_ENCODINGS)
+def test_payload_round_trip(encoding: str):
+    markmap: str = "# Überblick\n\n- <b>bold</b>\n- </script><script>alert(1)</script>\n"
+
+    payload: str = encode_markmap(markmap, encoding)
+
+    assert "</script><script>" not in payload
+    assert decode_markmap(payload, encoding) == markmap
+
+
+@pytest.mark.parametrize("encoding", PAYLOAD_ENCODINGS)
+def test_payload_round_trip_tree(encoding: str):
+    tree: str = json.dumps({"root": {"content": "</script> Ü", "children": []}}, ensure_ascii=False)
+
+    payload: str = encode_markmap(tree, encoding, tree=True)
+
+    assert json.loads(decode_markmap(payload, encoding, tree=True)) == json.loads(tree)
@@ -0,0 +1,35 @@
+import json
+import subprocess
+import sys
+from typing import Dict, List
+
+import pytest
+
+
+# dependencies, which must not be imported before they are needed
+DEFERRED_MODULES: List[str] = ["bs4", "requests", "urllib3", "cProfile", "mkdocs.livereload"]
+
+# import time of the package itself, once mkdocs and markdown are imported (measured ~30 ms)
+IMPORT_BUDGET: float = 0.06
+
+IMPORT_SCRIPT: str = """
+import json, sys, time
+import attr, jinja2, markdown, mkdocs.config.config_options, mkdocs.plugins, mkdocs.structure.pages
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "deferred": [name for name in {deferred!r} if name in sys.modules]}}))
+"""
+
+
+def import_module(module: str) -> Dict:
+    script: str = IMPORT_SCRIPT.format(module=module, deferred=DEFERRED_MODULES)
+    return json.loads(subprocess.check_output([sys.executable, "-c", script], text=True))
+
+
+@pytest.mark.parametrize("module", ["mkdocs_markmap.extension", "mkdocs_markmap.plugin"])
+def test_import(module: str):
+    results: List[Dict] = [import_module(module) for _ in range(3)]
+
+    assert results[0]["deferred"] == []
+    assert min(result["seconds"] for result in results) < IMPORT_BUDGET
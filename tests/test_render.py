@@ -0,0 +1,33 @@
+from pathlib import Path
+
+import pytest
+
+from mkdocs_markmap.render import render_tree
+
+
+def test_render_file(tmp_path: Path):
+    source: Path = tmp_path / "map.mm.md"
+    source.write_text("# map\n")
+
+    assert render_tree(source, cache_dir=tmp_path / "cache", offline=True, workers=1) == 1
+    assert "mkdocs-markmap" in (tmp_path / "map.html").read_text()
+    # up to date
+    assert render_tree(source, cache_dir=tmp_path / "cache", offline=True, workers=1) == 0
+
+
+def test_render_tree(tmp_path: Path):
+    (tmp_path / "maps" / "sub").mkdir(parents=True)
+    (tmp_path / "maps" / "sub" / "map.mm.md").write_text("# map\n")
+
+    render_tree(tmp_path / "maps", tmp_path / "out", cache_dir=tmp_path / "cache", offline=True, workers=1)
+
+    assert (tmp_path / "out" / "sub" / "map.html").is_file()
+
+
+def test_render_file_without_extension(tmp_path: Path):
+    source: Path = tmp_path / "map.md"
+    source.write_text("# map\n")
+
+    with pytest.raises(ValueError):
+        render_tree(source, cache_dir=tmp_path / "cache", offline=True, workers=1)
+    assert not (tmp_path / "map.html").exists()
@@ -0,0 +1,63 @@
+from typing import Any, Dict, List
+
+from mkdocs_markmap.split import chunk_placeholder, count_nodes, split_tree
+
+
+def node(content: str, *children: Dict[str, Any]) -> Dict[str, Any]:
+    return {"content": content, "children": list(children)}
+
+
+def chunked(content: str, chunk: str) -> Dict[str, Any]:
+    return {"content": content, "children": [chunk_placeholder()], "payload": {"fold": 1, "chunk": chunk}}
+
+
+def tree() -> Dict[str, Any]:
+    return node("root", node("a", node("a1", node("a11")), node("a2")), node("b"))
+
+
+def split(root: Dict[str, Any], depth: int) -> Dict[str, List[Dict[str, Any]]]:
+    chunks: Dict[str, List[Dict[str, Any]]] = {}
+
+    def write_chunk(chunk: List[Dict[str, Any]]) -> str:
+        name: str = f"chunk{len(chunks)}.json"
+        chunks[name] = chunk
+        return name
+
+    split_tree(root, depth, write_chunk)
+    return chunks
+
+
+def test_count_nodes():
+    assert count_nodes(tree()) == 6
+
+
+def test_split_tree():
+    root: Dict[str, Any] = tree()
+
+    chunks = split(root, 2)
+
+    # chunked nodes are folded and keep a placeholder child, so that they can be expanded
+    assert root["children"][0] == chunked("a", "chunk0.json")
+    assert root["children"][1] == node("b")
+    assert chunks == {"chunk0.json": [node("a1", node("a11")), node("a2")]}
+
+
+def test_split_tree_recursively():
+    root: Dict[str, Any] = tree()
+
+    chunks = split(root, 1)
+
+    # chunks hold at most the given number of levels as well
+    assert root == chunked("root", "chunk2.json")
+    assert chunks == {
+        "chunk0.json": [node("a11")],
+        "chunk1.json": [chunked("a1", "chunk0.json"), node("a2")],
+        "chunk2.json": [chunked("a", "chunk1.json"), node("b")],
+    }
+
+
+def test_split_tree_within_depth():
+    root: Dict[str, Any] = tree()
+
+    assert split(root, 4) == {}
+    assert root == tree()
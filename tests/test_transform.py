@@ -0,0 +1,87 @@
+from typing import Any, Dict, List
+
+from mkdocs_markmap.transform import outline, transform
+
+
+def node(content: str, tag: str, children: List[Dict[str, Any]] = (), **payload) -> Dict[str, Any]:
+    return {"content": content, "children": list(children), "payload": {"tag": tag, **payload}}
+
+
+def test_headings():
+    assert transform("# root\n\n## a\n\n### a1\n\n## b\n") == {
+        "root": node("root", "h1", [
+            node("a", "h2", [node("a1", "h3")]),
+            node("b", "h2"),
+        ]),
+    }
+
+
+def test_lists():
+    assert transform("# root\n\n- one\n  - nested\n- two\n\n1. first\n2. second\n") == {
+        "root": node("root", "h1", [
+            node("one", "li", [node("nested", "li")]),
+            node("two", "li"),
+            node("1. first", "li"),
+            node("2. second", "li"),
+        ]),
+    }
+
+
+def test_lists_below_headings():
+    assert transform("# root\n\n## a\n\n- item\n\n## b\n") == {
+        "root": node("root", "h1", [
+            node("a", "h2", [node("item", "li")]),
+            node("b", "h2"),
+        ]),
+    }
+
+
+def test_fold():
+    assert transform("# root\n\n## a <!-- markmap: fold -->\n\n- item <!-- markmap: fold -->\n  - child\n") == {
+        "root": node("root", "h1", [
+            node("a", "h2", [node("item", "li", [node("child", "li")], fold=1)], fold=1),
+        ]),
+    }
+
+
+def test_frontmatter():
+    data: Dict[str, Any] = transform("---\ntitle: ignored\nmarkmap:\n  colorFreezeLevel: 2\n---\n# root\n")
+
+    assert data == {"root": node("root", "h1"), "frontmatter": {"markmap": {"colorFreezeLevel": 2}}}
+
+
+def test_frontmatter_without_markmap_options():
+    assert transform("---\ntitle: ignored\n---\n# root\n") == {"root": node("root", "h1")}
+
+
+def test_code_fence():
+    assert transform("# root\n\n```python\nprint(1 < 2)\n# no heading\n```\n") == {
+        "root": node("root", "h1", [
+            node('<pre><code class="language-python">print(1 &lt; 2)\n# no heading</code></pre>', "pre"),
+        ]),
+    }
+
+
+def test_text_below_list_items():
+    assert transform("# root\n\n- item\n  continued\n\n  paragraph\n- next\n\nafter\n") == {
+        "root": node("root", "h1", [
+            node("item\ncontinued", "li", [node("paragraph", "p")]),
+            node("next", "li"),
+            node("after", "p"),
+        ]),
+    }
+
+
+def test_inline_markup():
+    assert transform("# **bold** and `code`\n") == {"root": node("<strong>bold</strong> and <code>code</code>", "h1")}
+
+
+def test_several_roots():
+    data: Dict[str, Any] = transform("# a\n\n# b\n")
+
+    assert data["root"]["content"] == ""
+    assert [child["content"] for child in data["root"]["children"]] == ["a", "b"]
+
+
+def test_outline():
+    assert outline(transform("# root\n\n- <em>a</em> &amp; b\n- c\n- c\n")["root"]) == ["root", "a & b", "c"]
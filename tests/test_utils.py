@@ -0,0 +1,28 @@
+from mkdocs_markmap.utils import inject_tags
+
+
+def test_inject_tags():
+    html: str = "<html><head><title>markmap</title></head><body><p>text</p></body></html>"
+
+    assert inject_tags(html, ["<script></script>"], ["<style></style>"]) == (
+        "<html><head><title>markmap</title><script></script></head>"
+        "<body><p>text</p><style></style></body></html>"
+    )
+
+
+def test_inject_tags_non_ascii():
+    # lowering "İ" yields two code points, positions must not be taken from a lowered copy
+    html: str = "<html><head><title>İstanbul İzmir</title></head><body><p>İİİ</p></body></html>"
+
+    assert inject_tags(html, ["<head-tag>"], ["<body-tag>"]) == (
+        "<html><head><title>İstanbul İzmir</title><head-tag></head>"
+        "<body><p>İİİ</p><body-tag></body></html>"
+    )
+
+
+def test_inject_tags_case_and_whitespace():
+    html: str = "<HTML><HEAD></HEAD ><BODY></Body><!-- </body> --></Body\n></HTML>"
+
+    assert inject_tags(html, ["<head-tag>"], ["<body-tag>"]) == (
+        "<HTML><HEAD><head-tag></HEAD ><BODY></Body><!-- </body> --><body-tag></Body\n></HTML>"
+    )